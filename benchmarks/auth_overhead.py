@@ -0,0 +1,64 @@
+'''
+Замер накладных расходов аутентификации на один запрос без базы данных.
+
+Сравнивает полную проверку подписи JWT на каждом запросе,
+проверку через кеш утверждений с пользователем из кеша
+и режим AUTH_CLAIMS_ONLY, в котором пользователь берется из токена.
+
+    python -m benchmarks.auth_overhead --seconds 3
+'''
+import argparse
+import asyncio
+import time
+
+from jose import jwt
+
+from src.auth.cache import token_cache, user_cache
+from src.auth.deps import get_token_user_by_token, get_user_by_token
+from src.auth.models import User
+from src.auth.utils import ALGORITHM, JWT_SECRET_KEY, create_access_token
+from src.config import settings
+import src.tasks.models  # noqa: F401 - для связи User.task
+
+
+async def measure(name: str, func, seconds: float) -> None:
+    done = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            await func()
+        done += 100
+    elapsed = time.perf_counter() - started
+    print(f'{name:>22}: {elapsed / done * 1e6:8.2f} us/request')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    user = User(id=1, login='bench_auth', password='-')
+    user_cache.set(user.login, user)
+    token = await create_access_token(user.login, user_id=user.id)
+
+    async def decode_every_time():
+        jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
+        return user_cache.get(user.login)
+
+    async def cached_claims():
+        return await get_user_by_token(token)
+
+    async def claims_only():
+        return await get_token_user_by_token(token)
+
+    await measure('jwt.decode + user', decode_every_time, args.seconds)
+    token_cache.clear()
+    await measure('cached claims + user', cached_claims, args.seconds)
+    settings.AUTH_CLAIMS_ONLY = True
+    await measure('claims only', claims_only, args.seconds)
+    print('token cache:', token_cache.stats())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+'''
+Сравнение пакетных эндпоинтов /tasks/bulk/ с поштучными запросами.
+
+Создает, изменяет и удаляет N задач сначала по одной,
+затем одним пакетным запросом на каждую операцию.
+
+    python -m benchmarks.bulk_vs_single --url http://127.0.0.1:8000 -n 1000
+'''
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.login_storm import auth_headers
+
+
+async def single(
+    client: httpx.AsyncClient, headers: dict[str, str], n: int
+) -> dict[str, float]:
+    timings = {}
+    started = time.perf_counter()
+    ids = []
+    for i in range(n):
+        response = await client.post(
+            '/tasks/', json={'text': f'task {i}'}, headers=headers)
+        ids.append(response.json()['id'])
+    timings['create'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for task_id in ids:
+        await client.patch(
+            f'/tasks/{task_id}/', json={'is_done': True}, headers=headers)
+    timings['update'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for task_id in ids:
+        await client.delete(f'/tasks/{task_id}/', headers=headers)
+    timings['delete'] = time.perf_counter() - started
+    return timings
+
+
+async def bulk(
+    client: httpx.AsyncClient, headers: dict[str, str], n: int
+) -> dict[str, float]:
+    timings = {}
+    started = time.perf_counter()
+    response = await client.post(
+        '/tasks/bulk/',
+        json={'tasks': [{'text': f'task {i}'} for i in range(n)]},
+        headers=headers,
+    )
+    ids = [task['id'] for task in response.json()]
+    timings['create'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await client.patch(
+        '/tasks/bulk/',
+        json={'tasks': [{'id': task_id, 'is_done': True} for task_id in ids]},
+        headers=headers,
+    )
+    timings['update'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await client.request(
+        'DELETE', '/tasks/bulk/', json={'ids': ids}, headers=headers)
+    timings['delete'] = time.perf_counter() - started
+    return timings
+
+
+async def run(url: str, n: int) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        headers = await auth_headers(client)
+        single_timings = await single(client, headers, n)
+        bulk_timings = await bulk(client, headers, n)
+    print(f'{"operation":<10} {"single, s":>10} {"bulk, s":>10} {"speedup":>8}')
+    for operation, single_time in single_timings.items():
+        bulk_time = bulk_timings[operation]
+        print(
+            f'{operation:<10} {single_time:>10.3f} {bulk_time:>10.3f} '
+            f'{single_time / bulk_time:>7.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('-n', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.n))
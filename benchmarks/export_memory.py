@@ -0,0 +1,124 @@
+'''
+Замер памяти сервера при выгрузке задач через /tasks/export/.
+
+Запускает uvicorn в отдельном процессе, для каждого размера создает
+пользователя с нужным числом задач и выкачивает выгрузку, следя
+за пиковым RSS процесса сервера (только Linux, читается /proc).
+
+    python -m benchmarks.export_memory --sizes 10000 100000 1000000
+'''
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+import httpx
+from sqlalchemy import delete, select, text
+
+from src.auth.models import User
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import Task
+
+
+PASSWORD = 'bench_password'
+
+
+def rss_mb(pid: int) -> float:
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def seed_user(client: httpx.AsyncClient, size: int) -> tuple[int, dict]:
+    login = f'bench_export_{size}'
+    await client.post('/users/', json={'login': login, 'password': PASSWORD})
+    response = await client.post(
+        '/users/login/', data={'username': login, 'password': PASSWORD})
+    headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+    async with async_session_factory() as session:
+        user_id = (await session.execute(
+            select(User.id).filter_by(login=login)
+        )).scalars().first()
+        await session.execute(
+            text(
+                'INSERT INTO task_table '
+                '(text, created_at, updated_at, is_done, author_id) '
+                "SELECT 'task ' || g, now(), now(), false, :uid "
+                'FROM generate_series(1, :n) AS g'
+            ),
+            {'uid': user_id, 'n': size},
+        )
+        await session.commit()
+    return user_id, headers
+
+
+async def cleanup(user_id: int) -> None:
+    async with async_session_factory() as session:
+        await session.execute(delete(Task).where(Task.author_id == user_id))
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def measure(
+    client: httpx.AsyncClient, pid: int, headers: dict, export_format: str
+) -> tuple[float, float, int]:
+    peak = baseline = rss_mb(pid)
+    received = 0
+    started = time.perf_counter()
+    async with client.stream(
+        'GET', '/tasks/export/',
+        params={'format': export_format}, headers=headers,
+    ) as response:
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            peak = max(peak, rss_mb(pid))
+    return peak - baseline, time.perf_counter() - started, received
+
+
+async def run(sizes: list[int], port: int) -> None:
+    server = subprocess.Popen([
+        sys.executable, '-m', 'uvicorn', 'src.main:app',
+        '--port', str(port), '--log-level', 'warning',
+    ])
+    try:
+        async with httpx.AsyncClient(
+            base_url=f'http://127.0.0.1:{port}', timeout=600
+        ) as client:
+            for _ in range(50):
+                try:
+                    await client.get('/docs')
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+            print(
+                f'{"tasks":>10} {"format":>7} {"rss growth, MB":>15} '
+                f'{"time, s":>8} {"MB sent":>8}'
+            )
+            for size in sizes:
+                user_id, headers = await seed_user(client, size)
+                try:
+                    for export_format in ('ndjson', 'csv'):
+                        growth, elapsed, received = await measure(
+                            client, server.pid, headers, export_format)
+                        print(
+                            f'{size:>10} {export_format:>7} {growth:>15.1f} '
+                            f'{elapsed:>8.2f} {received / 2**20:>8.1f}'
+                        )
+                finally:
+                    await cleanup(user_id)
+    finally:
+        server.terminate()
+        server.wait()
+        await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.port))
@@ -0,0 +1,420 @@
+'''
+Нагрузочный прогон всех основных эндпоинтов со смешанной нагрузкой.
+
+Заполняет БД из src/.env пользователями и задачами (равномерно
+или по закону Ципфа), затем в течение --duration секунд
+--concurrency клиентов выполняют сценарии в пропорциях --mix:
+список с offset и с фильтром, получение, изменение, удаление
+и создание задачи, логин и /users/me/.
+Для каждого сценария считает пропускную способность,
+p50/p95/p99 задержки и число запросов к БД на запрос (по /metrics),
+результат выводит в JSON для сравнения между коммитами.
+
+Через запущенный сервер (для нескольких воркеров число запросов
+к БД считается по тому воркеру, который ответил на /metrics;
+серверу нужен RATE_LIMIT_ENABLED=false):
+
+    python -m benchmarks.harness --url http://127.0.0.1:8000
+
+В том же процессе через ASGI, без сети:
+
+    python -m benchmarks.harness --asgi --users 100 --tasks 1000 \\
+        --output results.json
+'''
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from benchmarks.login_storm import percentile
+from src.auth.models import User
+from src.auth.utils import password_context
+from src.config import settings
+from src.database.db import async_engine, async_session_factory
+from src.main import app
+from src.tasks.models import (
+    Task,
+    TaskArchive,
+    TaskTombstone,
+    UserTaskDailyStats,
+    UserTaskStats,
+)
+from src.tasks.stats import rebuild_task_stats
+
+
+LOGIN_PREFIX = 'bench_h'
+PASSWORD = 'bench_password'
+SEED_BATCH_SIZE = 5000
+DEFAULT_MIX = (
+    'list=25,list_done=15,get=25,patch=10,delete=4,create=5,login=1,me=15')
+# сценарий -> (метод, шаблон пути) для запросов к БД из /metrics
+ROUTES = {
+    'list': ('GET', '/tasks/'),
+    'list_done': ('GET', '/tasks/'),
+    'get': ('GET', '/tasks/{task_id}/'),
+    'patch': ('PATCH', '/tasks/{task_id}/'),
+    'delete': ('DELETE', '/tasks/{task_id}/'),
+    'create': ('POST', '/tasks/'),
+    'login': ('POST', '/users/login/'),
+    'me': ('GET', '/users/me/'),
+}
+METRIC_LINE = re.compile(
+    r'^http_request_db_queries_(sum|count)'
+    r'\{method="([^"]*)",route="([^"]*)"\} (\S+)$'
+)
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ROUTES:
+            raise SystemExit(f'unknown scenario {name!r}, use {list(ROUTES)}')
+        weights[name] = int(weight)
+    return weights
+
+
+def tasks_per_user(
+    users: int, tasks: int, distribution: str
+) -> list[int]:
+    '''Раскладывает users * tasks задач по пользователям.'''
+    if distribution == 'uniform':
+        return [tasks] * users
+    weights = [1 / rank for rank in range(1, users + 1)]
+    scale = users * tasks / sum(weights)
+    return [max(1, round(weight * scale)) for weight in weights]
+
+
+async def drop_bench_data() -> None:
+    async with async_session_factory() as session:
+        user_ids = (await session.execute(
+            select(User.id).where(User.login.startswith(LOGIN_PREFIX))
+        )).scalars().all()
+        if user_ids:
+            for model, column in (
+                (Task, Task.author_id),
+                (TaskArchive, TaskArchive.author_id),
+                (TaskTombstone, TaskTombstone.author_id),
+                (UserTaskDailyStats, UserTaskDailyStats.user_id),
+                (UserTaskStats, UserTaskStats.user_id),
+            ):
+                await session.execute(
+                    delete(model).where(column.in_(user_ids)))
+            await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.commit()
+
+
+async def seed(
+    users: int, tasks: int, distribution: str, done_ratio: float
+) -> None:
+    '''Заполняет БД пользователями и задачами напрямую, минуя API.'''
+    await drop_bench_data()
+    hashed = password_context.hash(PASSWORD)
+    now = datetime.datetime.utcnow()
+    counts = tasks_per_user(users, tasks, distribution)
+    random.seed(0)
+    async with async_session_factory() as session:
+        user_ids = (await session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {'login': f'{LOGIN_PREFIX}{number}', 'password': hashed}
+                for number in range(users)
+            ],
+        )).scalars().all()
+        batch = []
+        for user_id, count in zip(user_ids, counts):
+            for number in range(count):
+                created_at = now - datetime.timedelta(
+                    minutes=random.randrange(60 * 24 * 90))
+                batch.append({
+                    'author_id': user_id,
+                    'text': f'task {number} of user {user_id}',
+                    'is_done': random.random() < done_ratio,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                })
+                if len(batch) >= SEED_BATCH_SIZE:
+                    await session.execute(insert(Task), batch)
+                    batch = []
+        if batch:
+            await session.execute(insert(Task), batch)
+        await rebuild_task_stats(session, user_ids)
+        await session.commit()
+    print(
+        f'seeded {users} users, {sum(counts)} tasks ({distribution})',
+        file=sys.stderr,
+    )
+
+
+class Session:
+    '''Залогиненный пользователь и id его задач.'''
+
+    def __init__(self, login: str, headers: dict, task_ids: list[int]):
+        self.login = login
+        self.headers = headers
+        self.task_ids = task_ids
+
+
+async def open_sessions(client: httpx.AsyncClient, count: int) -> list:
+    async with async_session_factory() as session:
+        users = (await session.execute(
+            select(User.id, User.login)
+            .where(User.login.startswith(LOGIN_PREFIX))
+            .order_by(User.id)
+            .limit(count)
+        )).all()
+        task_ids = defaultdict(list)
+        result = await session.execute(
+            select(Task.author_id, Task.id)
+            .where(Task.author_id.in_([user.id for user in users]))
+        )
+        for author_id, task_id in result:
+            task_ids[author_id].append(task_id)
+    if not users:
+        raise SystemExit('no benchmark users, run without --no-seed')
+    sessions = []
+    for user in users:
+        response = await client.post(
+            '/users/login/',
+            data={'username': user.login, 'password': PASSWORD},
+        )
+        response.raise_for_status()
+        token = response.json()['access_token']
+        sessions.append(Session(
+            user.login,
+            {'Authorization': f'Bearer {token}'},
+            task_ids[user.id],
+        ))
+    return sessions
+
+
+async def run_scenario(
+    name: str, client: httpx.AsyncClient, session: Session
+) -> httpx.Response:
+    headers = session.headers
+    if name == 'list':
+        return await client.get(
+            '/tasks/',
+            params={'limit': 20, 'offset': random.randrange(0, 200, 20)},
+            headers=headers,
+        )
+    if name == 'list_done':
+        return await client.get(
+            '/tasks/',
+            params={'limit': 20, 'done': random.random() < 0.5},
+            headers=headers,
+        )
+    if name == 'create':
+        response = await client.post(
+            '/tasks/', json={'text': 'bench task'}, headers=headers)
+        if response.status_code == 200:
+            session.task_ids.append(response.json()['id'])
+        return response
+    if name == 'login':
+        return await client.post(
+            '/users/login/',
+            data={'username': session.login, 'password': PASSWORD},
+        )
+    if name == 'me':
+        return await client.get('/users/me/', headers=headers)
+    if not session.task_ids:
+        return await client.post(
+            '/tasks/', json={'text': 'bench task'}, headers=headers)
+    if name == 'delete':
+        task_id = session.task_ids.pop(
+            random.randrange(len(session.task_ids)))
+        return await client.delete(f'/tasks/{task_id}/', headers=headers)
+    task_id = random.choice(session.task_ids)
+    if name == 'patch':
+        return await client.patch(
+            f'/tasks/{task_id}/',
+            json={'is_done': random.random() < 0.5},
+            headers=headers,
+        )
+    return await client.get(f'/tasks/{task_id}/', headers=headers)
+
+
+async def scrape_queries(client: httpx.AsyncClient) -> dict:
+    '''Возвращает (сумма, число) запросов к БД по (метод, маршрут).'''
+    response = await client.get('/metrics')
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for line in response.text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, method, route, value = match.groups()
+            totals[method, route][kind == 'count'] = float(value)
+    return totals
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    sessions: list[Session],
+    mix: dict[str, int],
+    duration: float,
+    concurrency: int,
+) -> tuple[dict, float]:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+
+    async def worker(number: int) -> None:
+        session = sessions[number % len(sessions)]
+        while time.perf_counter() < until:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await run_scenario(name, client, session)
+                failed = response.status_code >= 500
+            except httpx.HTTPError:
+                failed = True
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            errors[name] += failed
+
+    started = time.perf_counter()
+    until = started + duration
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return {'latencies': latencies, 'errors': errors}, (
+        time.perf_counter() - started)
+
+
+def summarize(
+    samples: dict, elapsed: float, before: dict, after: dict
+) -> dict:
+    scenarios = {}
+    for name, latencies in sorted(samples['latencies'].items()):
+        total, count = (
+            after[ROUTES[name]][index] - before[ROUTES[name]][index]
+            for index in (0, 1)
+        )
+        scenarios[name] = {
+            'requests': len(latencies),
+            'errors': samples['errors'][name],
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'db_queries_per_request': (
+                round(total / count, 2) if count else None),
+        }
+    every = [
+        latency
+        for latencies in samples['latencies'].values()
+        for latency in latencies
+    ]
+    return {
+        'scenarios': scenarios,
+        'total': {
+            'requests': len(every),
+            'errors': sum(samples['errors'].values()),
+            'rps': round(len(every) / elapsed, 1),
+            'p50_ms': round(percentile(every, 0.5), 2),
+            'p95_ms': round(percentile(every, 0.95), 2),
+            'p99_ms': round(percentile(every, 0.99), 2),
+        },
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(client: httpx.AsyncClient, args) -> dict:
+    mix = parse_mix(args.mix)
+    sessions = await open_sessions(client, args.sessions)
+    random.seed(args.seed)
+    if args.warmup > 0:
+        await drive(client, sessions, mix, args.warmup, args.concurrency)
+    before = await scrape_queries(client)
+    samples, elapsed = await drive(
+        client, sessions, mix, args.duration, args.concurrency)
+    after = await scrape_queries(client)
+    return {
+        'commit': git_commit(),
+        'mode': 'asgi' if args.asgi else 'http',
+        'params': {
+            key: getattr(args, key)
+            for key in (
+                'users', 'tasks', 'distribution', 'sessions',
+                'concurrency', 'duration', 'mix', 'seed',
+            )
+        },
+        'elapsed_seconds': round(elapsed, 2),
+        **summarize(samples, elapsed, before, after),
+    }
+
+
+async def main(args) -> None:
+    if not args.no_seed:
+        await seed(args.users, args.tasks, args.distribution, args.done_ratio)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.asgi:
+        # все клиенты приходят с одного адреса и упрутся в лимит логинов
+        settings.RATE_LIMIT_ENABLED = False
+        # ошибки приложения считаем ответами 500, как и по сети
+        transport = httpx.ASGITransport(
+            app=app, raise_app_exceptions=False)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=transport, base_url='http://bench', timeout=60,
+            ) as client:
+                result = await benchmark(client, args)
+    else:
+        async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=60,
+        ) as client:
+            result = await benchmark(client, args)
+    await async_engine.dispose()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    for name, stats in result['scenarios'].items():
+        print(
+            f'{name:>10}: {stats["rps"]:8.1f} rps  '
+            f'p50={stats["p50_ms"]:.1f}ms p95={stats["p95_ms"]:.1f}ms '
+            f'p99={stats["p99_ms"]:.1f}ms '
+            f'queries={stats["db_queries_per_request"]}',
+            file=sys.stderr,
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://127.0.0.1:8000')
+    target.add_argument('--asgi', action='store_true')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=1000,
+                        help='tasks per user on average')
+    parser.add_argument('--distribution', choices=('uniform', 'zipf'),
+                        default='uniform')
+    parser.add_argument('--done-ratio', type=float, default=0.3)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--sessions', type=int, default=20,
+                        help='users logged in during the run')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    asyncio.run(main(parser.parse_args()))
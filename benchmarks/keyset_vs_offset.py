@@ -0,0 +1,97 @@
+'''
+Сравнение offset- и курсорной пагинации списка задач.
+
+Создает пользователя с большим числом задач (по умолчанию 1 000 000)
+в базе из src/.env и замеряет время выборки страниц на разной глубине.
+
+    python -m benchmarks.keyset_vs_offset --tasks 1000000 --limit 100
+'''
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete, insert, select, text, tuple_
+
+from src.auth.models import User
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import Task
+
+
+async def seed(tasks: int) -> int:
+    async with async_session_factory() as session:
+        user_id = (await session.execute(
+            insert(User)
+            .values(login='bench_keyset', password='-')
+            .returning(User.id)
+        )).scalar_one()
+        await session.execute(
+            text(
+                'INSERT INTO task_table '
+                '(text, created_at, updated_at, is_done, author_id) '
+                "SELECT 'task ' || g, "
+                "now() - g * interval '1 second', now(), g % 2 = 0, :uid "
+                'FROM generate_series(1, :n) AS g'
+            ),
+            {'uid': user_id, 'n': tasks},
+        )
+        await session.commit()
+        await session.execute(text('ANALYZE task_table'))
+        return user_id
+
+
+async def cleanup(user_id: int) -> None:
+    async with async_session_factory() as session:
+        await session.execute(delete(Task).where(Task.author_id == user_id))
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def timed(session, query) -> tuple[float, list]:
+    started = time.perf_counter()
+    rows = (await session.execute(query)).all()
+    return (time.perf_counter() - started) * 1000, rows
+
+
+async def run(tasks: int, limit: int, depths: list[int]) -> None:
+    user_id = await seed(tasks)
+    try:
+        base = (
+            select(Task.id, Task.created_at)
+            .where(Task.author_id == user_id)
+            .order_by(Task.created_at, Task.id)
+            .limit(limit)
+        )
+        print(f'{"page offset":>12} {"offset, ms":>12} {"cursor, ms":>12}')
+        async with async_session_factory() as session:
+            for depth in depths:
+                if depth + limit > tasks:
+                    continue
+                offset_ms, rows = await timed(session, base.offset(depth))
+                # курсор указывает на строку перед страницей
+                anchor = (await session.execute(
+                    base.offset(depth - 1).limit(1)
+                )).one() if depth else None
+                keyset = base
+                if anchor is not None:
+                    keyset = base.where(
+                        tuple_(Task.created_at, Task.id)
+                        > (anchor.created_at, anchor.id)
+                    )
+                cursor_ms, cursor_rows = await timed(session, keyset)
+                assert rows == cursor_rows
+                print(f'{depth:>12} {offset_ms:>12.2f} {cursor_ms:>12.2f}')
+    finally:
+        await cleanup(user_id)
+        await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument(
+        '--depths', type=int, nargs='+',
+        default=[0, 1_000, 10_000, 100_000, 500_000, 999_000],
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.tasks, args.limit, args.depths))
@@ -0,0 +1,99 @@
+'''
+Нагрузочный тест: задержка GET /tasks/ во время потока логинов.
+
+Сначала замеряет задержку списка задач без фоновой нагрузки,
+затем — пока несколько клиентов непрерывно вызывают /users/login/.
+Если bcrypt блокирует event loop, p99 во второй фазе резко вырастет.
+
+    python -m benchmarks.login_storm --url http://127.0.0.1:8000
+'''
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+LOGIN = 'bench_login_storm'
+PASSWORD = 'bench_password'
+
+
+def percentile(samples: list[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def auth_headers(client: httpx.AsyncClient) -> dict[str, str]:
+    await client.post('/users/', json={'login': LOGIN, 'password': PASSWORD})
+    response = await client.post(
+        '/users/login/', data={'username': LOGIN, 'password': PASSWORD})
+    response.raise_for_status()
+    token = response.json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+async def read_tasks(
+    client: httpx.AsyncClient,
+    headers: dict[str, str],
+    until: float,
+    latencies: list[float],
+) -> None:
+    while time.perf_counter() < until:
+        started = time.perf_counter()
+        await client.get('/tasks/', params={'limit': 20}, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def login_loop(
+    client: httpx.AsyncClient, until: float, codes: dict[int, int]
+) -> None:
+    while time.perf_counter() < until:
+        response = await client.post(
+            '/users/login/', data={'username': LOGIN, 'password': PASSWORD})
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+
+async def phase(
+    client: httpx.AsyncClient,
+    headers: dict[str, str],
+    duration: float,
+    readers: int,
+    logins: int,
+) -> None:
+    until = time.perf_counter() + duration
+    latencies: list[float] = []
+    codes: dict[int, int] = {}
+    await asyncio.gather(
+        *(read_tasks(client, headers, until, latencies)
+          for _ in range(readers)),
+        *(login_loop(client, until, codes) for _ in range(logins)),
+    )
+    print(
+        f'logins={logins:<4} requests={len(latencies):<6} '
+        f'p50={percentile(latencies, 0.5):.1f}ms '
+        f'p99={percentile(latencies, 0.99):.1f}ms '
+        f'login statuses={codes}'
+    )
+
+
+async def run(url: str, duration: float, readers: int, logins: int) -> None:
+    limits = httpx.Limits(max_connections=readers + logins)
+    async with httpx.AsyncClient(
+        base_url=url, limits=limits, timeout=60
+    ) as client:
+        headers = await auth_headers(client)
+        for i in range(20):
+            await client.post(
+                '/tasks/', json={'text': f'task {i}'}, headers=headers)
+        await phase(client, headers, duration, readers, 0)
+        await phase(client, headers, duration, readers, logins)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.duration, args.readers, args.logins))
@@ -0,0 +1,87 @@
+'''
+Замер сериализации страницы задач без базы данных.
+
+Сравнивает стандартный путь FastAPI (валидация модели ответа
+из ORM объектов и jsonable_encoder) с FastJSONResponse,
+который кодирует строки запроса напрямую. Считает на одном ядре.
+
+    python -m benchmarks.serialization --rows 100 --seconds 3
+'''
+import argparse
+import asyncio
+import datetime
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import Row
+from sqlalchemy.engine.result import SimpleResultMetaData
+
+from src.responses import orjson, rows_response
+from src.tasks.crud import TASK_COLUMNS
+from src.tasks.models import Task
+import src.tasks.schemas as schemas
+
+
+def make_tasks(rows: int) -> tuple[list[Task], list[Row]]:
+    now = datetime.datetime.utcnow()
+    keys = [column.key for column in TASK_COLUMNS]
+    metadata = SimpleResultMetaData(keys)
+    orm_tasks, row_tasks = [], []
+    for number in range(rows):
+        values = {
+            'id': number,
+            'text': f'Задача номер {number} ' * 4,
+            'created_at': now,
+            'updated_at': now,
+            'is_done': number % 2 == 0,
+        }
+        values = tuple(values[key] for key in keys)
+        orm_tasks.append(Task(**dict(zip(keys, values))))
+        row_tasks.append(Row(metadata, None, metadata._key_to_index, values))
+    return orm_tasks, row_tasks
+
+
+def measure(name: str, func, seconds: float) -> None:
+    done = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        func()
+        done += 1
+    elapsed = time.perf_counter() - started
+    print(f'{name:>18}: {done / elapsed:10.1f} ops/s, '
+          f'{elapsed / done * 1000:.3f} ms/op')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    orm_tasks, row_tasks = make_tasks(args.rows)
+    field = create_response_field(
+        name='Response_get_task_list', type_=List[schemas.Task])
+    loop = asyncio.new_event_loop()
+
+    def default() -> bytes:
+        content = loop.run_until_complete(serialize_response(
+            field=field, response_content=orm_tasks, is_coroutine=True))
+        return JSONResponse(content).body
+
+    def fast() -> bytes:
+        return rows_response(row_tasks).body
+
+    assert len(default()) > 0 and len(fast()) > 0
+    print(f'{args.rows} tasks per response, '
+          f'encoder: {"orjson" if orjson else "pydantic_core"}')
+    measure('fastapi default', default, args.seconds)
+    measure('FastJSONResponse', fast, args.seconds)
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Размер и время отдачи страницы списка задач с ?fields= и text_max_len.
+
+Создает пользователя с задачами с длинным текстом в базе из src/.env
+и для нескольких наборов полей замеряет read_task_page: выборку из БД,
+передачу строк и кодирование в JSON. Выводит размер тела ответа
+и p50/p99 задержки.
+
+    python -m benchmarks.sparse_fields --tasks 10000 --limit 100
+'''
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete, insert, text
+
+from benchmarks.login_storm import percentile
+from src.auth.models import User
+from src.database.db import async_engine, async_session_factory
+from src.fields import parse_fields
+from src.tasks.crud import read_task_page
+from src.tasks.models import Task
+import src.tasks.schemas as schemas
+
+
+# (fields, text_max_len)
+VARIANTS = (
+    (None, None),
+    ('id,is_done,text', 40),
+    ('id,is_done', None),
+)
+
+
+async def seed(tasks: int, text_len: int) -> int:
+    async with async_session_factory() as session:
+        user_id = (await session.execute(
+            insert(User)
+            .values(login='bench_fields', password='-')
+            .returning(User.id)
+        )).scalar_one()
+        await session.execute(
+            text(
+                'INSERT INTO task_table '
+                '(text, created_at, updated_at, is_done, author_id) '
+                "SELECT rpad('task ' || g || ' ', :len, 'lorem ipsum '), "
+                "now() - g * interval '1 second', now(), g % 2 = 0, :uid "
+                'FROM generate_series(1, :n) AS g'
+            ),
+            {'uid': user_id, 'n': tasks, 'len': text_len},
+        )
+        await session.commit()
+        await session.execute(text('ANALYZE task_table'))
+        return user_id
+
+
+async def cleanup(user_id: int) -> None:
+    async with async_session_factory() as session:
+        await session.execute(delete(Task).where(Task.author_id == user_id))
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def run(tasks: int, text_len: int, limit: int, repeat: int) -> None:
+    user_id = await seed(tasks, text_len)
+    try:
+        print(
+            f'{"fields":>18} {"text_max_len":>12} {"bytes":>9} '
+            f'{"p50, ms":>9} {"p99, ms":>9}'
+        )
+        async with async_session_factory() as session:
+            for fields, text_max_len in VARIANTS:
+                names = parse_fields(fields, schemas.Task)
+                latencies = []
+                for number in range(repeat):
+                    offset = number * limit % max(tasks - limit, 1)
+                    started = time.perf_counter()
+                    page = await read_task_page(
+                        session, user_id, None, limit, offset, None, False,
+                        names, text_max_len,
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                print(
+                    f'{fields or "all":>18} {text_max_len or "-":>12} '
+                    f'{len(page.body):>9} '
+                    f'{percentile(latencies, 0.5):>9.2f} '
+                    f'{percentile(latencies, 0.99):>9.2f}'
+                )
+    finally:
+        await cleanup(user_id)
+        await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=10_000)
+    parser.add_argument('--text-len', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.tasks, args.text_len, args.limit, args.repeat))
@@ -0,0 +1,110 @@
+'''
+Замер поиска задач /tasks/search/ на большой таблице.
+
+Заполняет task_table задачами нескольких пользователей
+(по умолчанию 2 000 000 строк), затем через запущенный сервер
+замеряет задержку поиска по словам и по подстроке.
+
+    python -m benchmarks.task_search --url http://127.0.0.1:8000 --rows 2000000
+'''
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import delete, select, text
+
+from benchmarks.login_storm import percentile
+from src.auth.models import User
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import Task
+
+
+PASSWORD = 'bench_password'
+WORDS = (
+    'report', 'invoice', 'meeting', 'deploy', 'review',
+    'groceries', 'dentist', 'release', 'backup', 'migration',
+)
+QUERIES = ('deploy', 'meeting review', '"release backup"', 'voic', 'a1b2')
+
+
+async def seed(client: httpx.AsyncClient, rows: int, users: int) -> tuple:
+    headers = None
+    user_ids = []
+    for number in range(users):
+        login = f'bench_search_{number}'
+        await client.post(
+            '/users/', json={'login': login, 'password': PASSWORD})
+        if headers is None:
+            response = await client.post(
+                '/users/login/', data={'username': login, 'password': PASSWORD})
+            token = response.json()['access_token']
+            headers = {'Authorization': f'Bearer {token}'}
+    async with async_session_factory() as session:
+        user_ids = (await session.execute(
+            select(User.id).where(User.login.like('bench_search_%'))
+        )).scalars().all()
+        await session.execute(
+            text(
+                'INSERT INTO task_table '
+                '(text, created_at, updated_at, is_done, author_id) '
+                'SELECT w.words[1 + g % 10] || \' \' '
+                '|| w.words[1 + (g / 10) % 10] || \' \' || md5(g::text), '
+                'now(), now(), g % 3 = 0, w.users[1 + g % :user_count] '
+                'FROM generate_series(1, :n) AS g, '
+                '(SELECT CAST(:words AS text[]) AS words, '
+                'CAST(:users AS integer[]) AS users) AS w'
+            ),
+            {
+                'words': list(WORDS),
+                'users': list(user_ids),
+                'user_count': len(user_ids),
+                'n': rows,
+            },
+        )
+        await session.commit()
+        await session.execute(text('ANALYZE task_table'))
+    return user_ids, headers
+
+
+async def cleanup(user_ids: list[int]) -> None:
+    async with async_session_factory() as session:
+        await session.execute(
+            delete(Task).where(Task.author_id.in_(user_ids)))
+        await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.commit()
+
+
+async def run(url: str, rows: int, users: int, repeat: int) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        user_ids, headers = await seed(client, rows, users)
+        try:
+            print(f'{"query":<18} {"hits":>6} {"p50, ms":>8} {"p99, ms":>8}')
+            for query in QUERIES:
+                latencies = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = await client.get(
+                        '/tasks/search/',
+                        params={'q': query, 'limit': 100},
+                        headers=headers,
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                print(
+                    f'{query:<18} {len(response.json()):>6} '
+                    f'{percentile(latencies, 0.5):>8.1f} '
+                    f'{percentile(latencies, 0.99):>8.1f}'
+                )
+        finally:
+            await cleanup(user_ids)
+            await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.rows, args.users, args.repeat))
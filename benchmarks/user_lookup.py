@@ -0,0 +1,104 @@
+'''
+Замер задержки поиска пользователя по логину при аутентификации.
+
+Заполняет БД из src/.env пользователями (по умолчанию 1 000 000)
+одним INSERT ... SELECT generate_series, затем вызывает
+get_user_by_token для случайных пользователей с пустым кешем
+пользователей, так что каждый вызов идет в БД. Выводит план запроса
+и p50/p99 задержки. Для сравнения с последовательным сканированием
+запустите на ревизии до миграции c8f2a4d6e9b1.
+
+    python -m benchmarks.user_lookup --users 1000000 --lookups 2000
+    python -m benchmarks.user_lookup --cleanup
+'''
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import String, cast, delete, func, insert, literal, select
+
+from benchmarks.login_storm import percentile
+from src.auth.cache import user_cache
+from src.auth.deps import get_user_by_token
+from src.auth.models import User
+from src.auth.utils import create_access_token
+from src.database.db import async_engine, async_session_factory
+import src.tasks.models  # noqa: F401 - для связи User.task
+
+
+LOGIN_PREFIX = 'bench_u'
+
+
+async def seed(users: int) -> None:
+    '''Добавляет недостающих пользователей bench_u0 ... bench_u{users - 1}.'''
+    async with async_session_factory() as session:
+        existing = (await session.execute(
+            select(func.count()).where(User.login.startswith(LOGIN_PREFIX))
+        )).scalar_one()
+        if existing >= users:
+            return
+        number = func.generate_series(existing, users - 1).column_valued()
+        await session.execute(insert(User).from_select(
+            ['login', 'password', 'registred_at'],
+            select(
+                literal(LOGIN_PREFIX) + cast(number, String),
+                literal('-'),
+                func.now(),
+            ),
+        ))
+        await session.commit()
+        print(f'seeded {users - existing} users')
+
+
+async def explain(login: str) -> None:
+    query = select(User).filter_by(login=login)
+    async with async_engine.connect() as conn:
+        compiled = query.compile(
+            conn.sync_engine, compile_kwargs={'literal_binds': True})
+        plan = (await conn.exec_driver_sql(
+            f'EXPLAIN ANALYZE {compiled}')).scalars().all()
+    print('\n'.join(plan))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument(
+        '--cleanup', action='store_true', help='delete seeded users and exit')
+    args = parser.parse_args()
+
+    if args.cleanup:
+        async with async_session_factory() as session:
+            await session.execute(
+                delete(User).where(User.login.startswith(LOGIN_PREFIX)))
+            await session.commit()
+        await async_engine.dispose()
+        return
+
+    await seed(args.users)
+    random.seed(0)
+    logins = [
+        f'{LOGIN_PREFIX}{random.randrange(args.users)}'
+        for _ in range(args.lookups)
+    ]
+    tokens = [await create_access_token(login) for login in logins]
+    await explain(logins[0])
+
+    latencies = []
+    for token in tokens:
+        user_cache.clear()
+        started = time.perf_counter()
+        await get_user_by_token(token)
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(
+        f'users={args.users} lookups={len(latencies)} '
+        f'p50={percentile(latencies, 0.5):.2f}ms '
+        f'p99={percentile(latencies, 0.99):.2f}ms'
+    )
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""task keyset indexes
+
+Revision ID: 3c1f0a7d9b2e
+Revises: 005a94bcc70c
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0a7d9b2e'
+down_revision: Union[str, None] = '005a94bcc70c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # индексы строятся CONCURRENTLY, чтобы не блокировать запись в таблицу
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_task_table_author_id_created_at_id',
+            'task_table',
+            ['author_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_task_table_author_id_created_at_id_done',
+            'task_table',
+            ['author_id', 'created_at', 'id'],
+            postgresql_where=sa.text('is_done'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_task_table_author_id_created_at_id_open',
+            'task_table',
+            ['author_id', 'created_at', 'id'],
+            postgresql_where=sa.text('NOT is_done'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_task_table_author_id_created_at_id_open',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_task_table_author_id_created_at_id_done',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_task_table_author_id_created_at_id',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
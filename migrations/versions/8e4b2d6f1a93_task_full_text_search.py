@@ -0,0 +1,64 @@
+"""task full text search
+
+Revision ID: 8e4b2d6f1a93
+Revises: 3c1f0a7d9b2e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b2d6f1a93'
+down_revision: Union[str, None] = '3c1f0a7d9b2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # добавление хранимой вычисляемой колонки переписывает таблицу
+    op.add_column(
+        'task_table',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', text)", persisted=True),
+            nullable=False,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_task_table_search_vector',
+            'task_table',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_task_table_text_trgm',
+            'task_table',
+            ['text'],
+            postgresql_using='gin',
+            postgresql_ops={'text': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_task_table_text_trgm',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_task_table_search_vector',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('task_table', 'search_vector')
@@ -0,0 +1,39 @@
+"""revoked tokens
+
+Revision ID: a6e1c3f8d5b9
+Revises: f3c9a5e7b2d4
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6e1c3f8d5b9'
+down_revision: Union[str, None] = 'f3c9a5e7b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('revoked_token_table',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(
+        'ix_revoked_token_table_expires_at',
+        'revoked_token_table',
+        ['expires_at'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_revoked_token_table_expires_at',
+        table_name='revoked_token_table',
+    )
+    op.drop_table('revoked_token_table')
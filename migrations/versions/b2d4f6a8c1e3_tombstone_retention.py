@@ -0,0 +1,34 @@
+"""tombstone retention
+
+Revision ID: b2d4f6a8c1e3
+Revises: e5b7d9f1a3c6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c1e3'
+down_revision: Union[str, None] = 'e5b7d9f1a3c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user_table',
+        sa.Column(
+            'tombstones_pruned_version',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user_table', 'tombstones_pruned_version')
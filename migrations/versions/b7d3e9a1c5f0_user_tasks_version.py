@@ -0,0 +1,34 @@
+"""user tasks version
+
+Revision ID: b7d3e9a1c5f0
+Revises: 8e4b2d6f1a93
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3e9a1c5f0'
+down_revision: Union[str, None] = '8e4b2d6f1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user_table',
+        sa.Column(
+            'tasks_version',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user_table', 'tasks_version')
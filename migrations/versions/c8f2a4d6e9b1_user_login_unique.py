@@ -0,0 +1,50 @@
+"""user login unique index
+
+Revision ID: c8f2a4d6e9b1
+Revises: a6e1c3f8d5b9
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f2a4d6e9b1'
+down_revision: Union[str, None] = 'a6e1c3f8d5b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # с дублями CREATE UNIQUE INDEX CONCURRENTLY оставит невалидный индекс,
+    # поэтому проверяем их заранее
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT login FROM user_table GROUP BY login HAVING count(*) > 1 '
+        'LIMIT 10'
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            'user_table has duplicate logins, resolve them before '
+            f'upgrading: {", ".join(duplicates)}'
+        )
+    # индекс строится CONCURRENTLY, чтобы не блокировать регистрацию
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_table_login',
+            'user_table',
+            ['login'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_table_login',
+            table_name='user_table',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,65 @@
+"""task change feed
+
+Revision ID: d2a8f4c6e1b7
+Revises: b7d3e9a1c5f0
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8f4c6e1b7'
+down_revision: Union[str, None] = 'b7d3e9a1c5f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'task_table',
+        sa.Column(
+            'version',
+            sa.BigInteger(),
+            server_default='0',
+            nullable=False,
+        ),
+    )
+    op.create_table('task_tombstone_table',
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['user_table.id'], ),
+    sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index(
+        'ix_task_tombstone_table_author_id_version_task_id',
+        'task_tombstone_table',
+        ['author_id', 'version', 'task_id'],
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_task_table_author_id_version_id',
+            'task_table',
+            ['author_id', 'version', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_task_table_author_id_version_id',
+            table_name='task_table',
+            postgresql_concurrently=True,
+        )
+    op.drop_index(
+        'ix_task_tombstone_table_author_id_version_task_id',
+        table_name='task_tombstone_table',
+    )
+    op.drop_table('task_tombstone_table')
+    op.drop_column('task_table', 'version')
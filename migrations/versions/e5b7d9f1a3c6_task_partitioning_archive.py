@@ -0,0 +1,186 @@
+"""task hash partitioning and archive
+
+Revision ID: e5b7d9f1a3c6
+Revises: c8f2a4d6e9b1
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7d9f1a3c6'
+down_revision: Union[str, None] = 'c8f2a4d6e9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TASK_PARTITIONS = 16
+TASK_COLUMNS = 'id, text, created_at, updated_at, is_done, author_id, version'
+
+
+def task_columns() -> list[sa.Column]:
+    return [
+        sa.Column(
+            'id', sa.Integer(),
+            server_default=sa.text("nextval('task_table_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('is_done', sa.Boolean(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', text)", persisted=True),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ['author_id'], ['user_table.id'],
+            name='task_table_author_id_fkey',
+        ),
+    ]
+
+
+def create_task_indexes() -> None:
+    op.create_index(
+        'ix_task_table_author_id_created_at_id',
+        'task_table',
+        ['author_id', 'created_at', 'id'],
+    )
+    op.create_index(
+        'ix_task_table_author_id_created_at_id_done',
+        'task_table',
+        ['author_id', 'created_at', 'id'],
+        postgresql_where=sa.text('is_done'),
+    )
+    op.create_index(
+        'ix_task_table_author_id_created_at_id_open',
+        'task_table',
+        ['author_id', 'created_at', 'id'],
+        postgresql_where=sa.text('NOT is_done'),
+    )
+    op.create_index(
+        'ix_task_table_author_id_version_id',
+        'task_table',
+        ['author_id', 'version', 'id'],
+    )
+    op.create_index(
+        'ix_task_table_search_vector',
+        'task_table',
+        ['search_vector'],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_task_table_text_trgm',
+        'task_table',
+        ['text'],
+        postgresql_using='gin',
+        postgresql_ops={'text': 'gin_trgm_ops'},
+    )
+
+
+def replace_task_table(new_table: str) -> None:
+    '''
+    Заменяет task_table заполненной таблицей new_table.
+    Последовательность id переживает удаление старой таблицы.
+    '''
+    op.execute('ALTER SEQUENCE task_table_id_seq OWNED BY NONE')
+    op.drop_table('task_table')
+    op.rename_table(new_table, 'task_table')
+    op.execute(
+        f'ALTER TABLE task_table RENAME CONSTRAINT {new_table}_pkey '
+        'TO task_table_pkey'
+    )
+    op.execute('ALTER SEQUENCE task_table_id_seq OWNED BY task_table.id')
+    create_task_indexes()
+    op.execute('ANALYZE task_table')
+
+
+def upgrade() -> None:
+    # Таблица копируется целиком: чтение остается доступным,
+    # запись ждет конца миграции.
+    op.execute('LOCK TABLE task_table IN EXCLUSIVE MODE')
+    op.create_table(
+        'task_table_partitioned',
+        *task_columns(),
+        sa.PrimaryKeyConstraint(
+            'id', 'author_id', name='task_table_partitioned_pkey'),
+        postgresql_partition_by='HASH (author_id)',
+    )
+    for remainder in range(TASK_PARTITIONS):
+        op.execute(
+            f'CREATE TABLE task_table_p{remainder} '
+            'PARTITION OF task_table_partitioned '
+            f'FOR VALUES WITH (MODULUS {TASK_PARTITIONS}, '
+            f'REMAINDER {remainder})'
+        )
+    op.execute(
+        f'INSERT INTO task_table_partitioned ({TASK_COLUMNS}) '
+        f'SELECT {TASK_COLUMNS} FROM task_table'
+    )
+    replace_task_table('task_table_partitioned')
+
+    op.create_table(
+        'task_archive_table',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('is_done', sa.Boolean(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['user_table.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_task_archive_table_author_id_created_at_id',
+        'task_archive_table',
+        ['author_id', 'created_at', 'id'],
+    )
+
+
+def downgrade() -> None:
+    # архивные задачи возвращаются в обычную таблицу
+    op.execute('LOCK TABLE task_table IN EXCLUSIVE MODE')
+    op.create_table(
+        'task_table_plain',
+        *task_columns(),
+        sa.PrimaryKeyConstraint('id', name='task_table_plain_pkey'),
+    )
+    # возвращенные задачи получают новую версию, а их отметки об удалении
+    # удаляются: иначе синхронизация их не увидит, а повторное удаление
+    # нарушит первичный ключ task_tombstone_table
+    op.execute(
+        'UPDATE user_table SET tasks_version = tasks_version + 1 '
+        'WHERE id IN (SELECT author_id FROM task_archive_table)'
+    )
+    op.execute(
+        'DELETE FROM task_tombstone_table '
+        'WHERE task_id IN (SELECT id FROM task_archive_table)'
+    )
+    op.execute(
+        f'INSERT INTO task_table_plain ({TASK_COLUMNS}) '
+        f'SELECT {TASK_COLUMNS} FROM task_table '
+        'UNION ALL '
+        'SELECT a.id, a.text, a.created_at, a.updated_at, a.is_done, '
+        'a.author_id, u.tasks_version '
+        'FROM task_archive_table AS a '
+        'JOIN user_table AS u ON u.id = a.author_id'
+    )
+    op.drop_index(
+        'ix_task_archive_table_author_id_created_at_id',
+        table_name='task_archive_table',
+    )
+    op.drop_table('task_archive_table')
+    # секции удаляются вместе с секционированной таблицей
+    replace_task_table('task_table_plain')
@@ -0,0 +1,142 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from src.config import settings
+
+
+class TTLCache:
+    '''
+    Ограниченный по размеру кеш с временем жизни записей.
+    При переполнении вытесняется давно не использованная запись (LRU).
+    '''
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        '''Позволяет получить значение из кеша, если оно не устарело.'''
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        '''
+        Позволяет положить значение в кеш.
+        Через ttl можно сократить время жизни конкретной записи.
+        '''
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        '''Позволяет удалить запись из кеша.'''
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        '''Возвращает счетчики попаданий, промахов и вытеснений.'''
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class ExpiringSet:
+    '''
+    Множество ключей, каждый из которых хранится до своего времени
+    истечения (по time.time()). При переполнении первыми вытесняются
+    ключи, которые истекут раньше всех.
+    '''
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: dict[Hashable, float] = {}
+        self._expiry: list[tuple[float, Hashable]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires_at = self._data.get(key)
+        if expires_at is None or expires_at <= time.time():
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, key: Hashable, expires_at: float) -> None:
+        '''Позволяет добавить ключ до времени expires_at.'''
+        if self.maxsize <= 0 or expires_at <= time.time():
+            return
+        self._prune()
+        if key not in self._data:
+            # вытесняем до добавления, иначе _pop мог бы достать из кучи
+            # сам новый ключ, которого еще нет в _data
+            while len(self._data) >= self.maxsize:
+                self._pop()
+                self.evictions += 1
+            heapq.heappush(self._expiry, (expires_at, key))
+        self._data[key] = max(expires_at, self._data.get(key, 0))
+
+    def _pop(self) -> None:
+        expires_at, key = heapq.heappop(self._expiry)
+        if self._data.get(key) == expires_at:
+            del self._data[key]
+        elif key in self._data:
+            # срок ключа продлевали, возвращаем его с новым сроком
+            heapq.heappush(self._expiry, (self._data[key], key))
+
+    def _prune(self) -> None:
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            self._pop()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._expiry.clear()
+
+    def stats(self) -> dict[str, int]:
+        '''Возвращает счетчики попаданий, промахов и вытеснений.'''
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+# пользователи по логину (sub токена)
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+# проверенные утверждения access токенов по sha256 токена
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+# jti отозванных refresh токенов, копия revoked_token_table
+revoked_tokens = ExpiringSet(maxsize=settings.REVOKED_TOKENS_SIZE)
@@ -1,101 +1,236 @@
+import datetime
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import select
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import async_session_factory
+from src.config import settings
+from src.database.db import async_session_factory, mark_write
+from src.database.deps import UnitOfWork, get_unit_of_work
 from src.auth.utils import (
     get_hashed_password,
     verify_password,
     create_access_token,
     create_refresh_token,
+    decode_refresh_token,
 )
-from src.auth.models import User
+from src.auth.cache import revoked_tokens, user_cache
+from src.auth.models import RevokedToken, User
 import src.auth.schemas as schemas
+from src.fields import list_json, parse_fields
+from src.responses import rows_response
 from src.auth.deps import get_current_user
+from src.tasks.events import publish_user_changed
 
 
 router = APIRouter(tags=['users'])
 
+USER_COLUMNS = (
+    User.id,
+    User.login,
+    User.email,
+    User.first_name,
+    User.last_name,
+    User.registred_at,
+)
+
 
 @router.get('/')
 async def get_user_list(
     limit: int = 100,
     offset: int = 0,
+    fields: str | None = None,
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> List[schemas.User]:
     '''
     Позволяет получить список пользователей.
     Доступна пагинация через параметры limit и offset.
+    Через fields=id,login можно получить только нужные поля,
+    из БД тогда читаются только они.
     '''
-    async with async_session_factory() as session:
-        query = select(User).limit(limit).offset(offset)
-        result = await session.execute(query)
-        users = result.scalars().all()
+    names = parse_fields(fields, schemas.User)
+    columns = [column for column in USER_COLUMNS if column.key in names]
+    query = select(*columns).limit(limit).offset(offset)
+    result = await uow.reader().execute(query)
+    users = result.all()
+    if settings.FAST_JSON_RESPONSES:
+        return rows_response(users)
+    if fields is None:
         return users
+    return Response(
+        list_json(schemas.User, names, users), media_type='application/json')
 
 
 @router.post('/')
-async def create_user(user: schemas.UserCreate) -> schemas.User:
-    '''Позволяет регистрировать пользователя.'''
-    async with async_session_factory() as session:
-        user_data = user.model_dump(exclude_unset=True)
-        query = select(User).filter_by(login=user_data.get('login'))
-        username_result = await session.execute(query)
-        db_username = username_result.scalars().all()
-        if len(db_username) > 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Login is already in use"
-            )
-        user_data['password'] = await get_hashed_password(user_data.get('password'))
-        db_user = User(**user_data)
-        session.add(db_user)
-        await session.commit()
-        await session.refresh(db_user)
-        return db_user
+async def create_user(
+    user: schemas.UserCreate,
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> schemas.User:
+    '''
+    Позволяет регистрировать пользователя.
+    Занятость логина проверяется уникальным индексом
+    в том же запросе, что и вставка.
+    '''
+    user_data = user.model_dump(exclude_unset=True)
+    # хеш считается до обращения к БД, чтобы не держать соединение
+    user_data['password'] = await get_hashed_password(user_data.get('password'))
+    session = uow.session
+    result = await session.execute(
+        insert(User)
+        .values(**user_data)
+        .on_conflict_do_nothing(index_elements=[User.login])
+        .returning(*USER_COLUMNS)
+    )
+    db_user = result.one_or_none()
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Login is already in use"
+        )
+    await session.commit()
+    mark_write(db_user.id)
+    return db_user
 
 
 @router.patch('/')
 async def patch_user(
     user: schemas.UserUpdate,
-    user_auth: User = Depends(get_current_user)
+    user_auth: User = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> schemas.User:
     '''Позволяет изменять информацию о пользователе самому пользователю.'''
-    async with async_session_factory() as session:
-        user_data = user.model_dump(exclude_unset=True)
-        for key, val in user_data.items():
-            setattr(user_auth, key, val)
-        session.add(user_auth)
-        await session.commit()
-        await session.refresh(user_auth)
-        return user_auth
+    session = uow.session
+    db_user = await session.get(User, user_auth.id)
+    user_data = user.model_dump(exclude_unset=True)
+    for key, val in user_data.items():
+        setattr(db_user, key, val)
+    session.add(db_user)
+    await publish_user_changed(session, db_user.login)
+    await session.commit()
+    await session.refresh(db_user)
+    # кладем в кеш свежий объект, чтобы не прочитать устаревшие
+    # данные с отстающей реплики
+    session.expunge(db_user)
+    mark_write(db_user.id)
+    user_cache.set(db_user.login, db_user)
+    return db_user
 
 
 @router.post('/login/')
 async def login_user(
-    form_data: OAuth2PasswordRequestForm = Depends()
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> schemas.Token:
     '''Позволяет юзеру получить access и refresh токены.'''
+    # читаем из primary: пользователь мог только что зарегистрироваться
+    query = select(User.id, User.login, User.password).filter_by(
+        login=form_data.username)
+    db_user = await uow.session.execute(query)
+    user_to_login = db_user.one_or_none()
+    if user_to_login is None:
+        raise HTTPException(
+            status_code=404, detail="User dosent exist")
+    # соединение больше не нужно, возвращаем его в пул до проверки пароля
+    await uow.release()
+    hashed_pass = user_to_login.password
+    if not await verify_password(
+        form_data.password,
+        hashed_pass=hashed_pass
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Password is incorrect"
+        )
+    return {
+        'access_token': await create_access_token(
+            user_to_login.login, user_id=user_to_login.id),
+        'refresh_token': await create_refresh_token(
+            user_to_login.login, user_id=user_to_login.id),
+    }
+
+
+async def revoke_refresh_token(
+    session: AsyncSession, token_data: schemas.TokenPayload
+) -> bool:
+    '''
+    Отзывает refresh токен в текущей транзакции.
+    Возвращает False, если токен уже был отозван (в том числе
+    параллельным запросом с тем же токеном).
+    '''
+    result = await session.execute(
+        insert(RevokedToken)
+        .values(
+            jti=token_data.jti,
+            expires_at=datetime.datetime.utcfromtimestamp(token_data.exp),
+        )
+        .on_conflict_do_nothing()
+        .returning(RevokedToken.jti)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def load_revoked_tokens() -> None:
+    '''
+    Удаляет истекшие отозванные токены из БД
+    и загружает оставшиеся в revoked_tokens.
+    '''
+    now = datetime.datetime.utcnow()
     async with async_session_factory() as session:
-        query = select(User).filter_by(login=form_data.username)
-        db_user = await session.execute(query)
-        user_to_login = db_user.scalars().all()[0]
-        if not user_to_login:
-            raise HTTPException(
-                status_code=404, detail="User dosent exist")
-        hashed_pass = user_to_login.password
-        if not await verify_password(
-            form_data.password,
-            hashed_pass=hashed_pass
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Password is incorrect"
-            )
-        return {
-            'access_token': await create_access_token(user_to_login.login),
-            'refresh_token': await create_refresh_token(user_to_login.login),
-        }
+        await session.execute(
+            delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        await session.commit()
+        result = await session.stream(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .order_by(RevokedToken.expires_at.desc())
+            .limit(settings.REVOKED_TOKENS_SIZE)
+        )
+        async for jti, expires_at in result:
+            revoked_tokens.add(
+                jti, expires_at.replace(
+                    tzinfo=datetime.timezone.utc).timestamp())
+
+
+@router.post('/refresh/')
+async def refresh_tokens(
+    data: schemas.TokenRefresh,
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> schemas.Token:
+    '''
+    Позволяет обменять refresh токен на новую пару токенов без пароля.
+    Refresh токен одноразовый: после обмена он отзывается,
+    повторное использование возвращает 401.
+    '''
+    token_data = decode_refresh_token(data.refresh_token)
+    reused = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token revoked",
+    )
+    # повторы отсекаем в памяти, не обращаясь к БД
+    if token_data.jti in revoked_tokens:
+        raise reused
+    session = uow.session
+    if not await revoke_refresh_token(session, token_data):
+        await session.rollback()
+        revoked_tokens.add(token_data.jti, token_data.exp)
+        raise reused
+    user = (await session.execute(
+        select(User.id, User.login).filter_by(login=token_data.sub)
+    )).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find user",
+        )
+    await session.commit()
+    revoked_tokens.add(token_data.jti, token_data.exp)
+    return {
+        'access_token': await create_access_token(
+            user.login, user_id=user.id),
+        'refresh_token': await create_refresh_token(
+            user.login, user_id=user.id),
+    }
 
 
 @router.get('/me/')
@@ -105,11 +240,13 @@ async def get_me(user: User = Depends(get_current_user)) -> schemas.User:
 
 
 @router.get('/{user_id}/')
-async def get_user(user_id: int) -> schemas.User:
+async def get_user(
+    user_id: int,
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> schemas.User:
     '''Выводит информцию о пользователе, выбранном по id.'''
-    async with async_session_factory() as session:
-        db_user = await session.get(User, user_id)
-        if not db_user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        return db_user
+    db_user = await uow.reader().get(User, user_id)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return db_user
@@ -1,15 +1,20 @@
-from datetime import datetime
+import hashlib
+import time
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 from pydantic import ValidationError
 
+from src.auth.cache import token_cache, user_cache
 from src.auth.models import User
 from src.auth.utils import JWT_SECRET_KEY, ALGORITHM
-from src.auth.schemas import TokenPayload, SystemUser
-from src.database.db import async_session_factory
+from src.auth.schemas import TokenPayload, TokenUser, SystemUser
+from src.config import settings
+from src.database.db import read_session
+from src.database.deps import UnitOfWork, get_unit_of_work
 
 
 reuseable_oauth = OAuth2PasswordBearer(
@@ -19,38 +24,144 @@ reuseable_oauth = OAuth2PasswordBearer(
 
 
 async def get_current_user(
-    token: str = Depends(reuseable_oauth)
+    token: str = Depends(reuseable_oauth),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> SystemUser:
     '''
     Позволяет получать юзера, который делает запрос,
     а так же проверяет его токен на валидность.
+    Пользователь загружается в общей сессии запроса.
     '''
-    async with async_session_factory() as session:
-        try:
-            payload = jwt.decode(
-                token, JWT_SECRET_KEY, algorithms=[ALGORITHM]
-            )
-            token_data = TokenPayload(**payload)
-
-            if datetime.fromtimestamp(token_data.exp) < datetime.now():
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token expired",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except (jwt.JWTError, ValidationError):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        query = select(User).filter_by(login=token_data.sub)
-        db_user = await session.execute(query)
-        user_to_login = db_user.scalars().all()[0]
-        if not user_to_login:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Could not find user",
-            )
+    return await get_user_by_token(token, uow)
 
+
+async def get_token_user(
+    token: str = Depends(reuseable_oauth),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> TokenUser | SystemUser:
+    '''
+    Позволяет получить id и логин юзера, который делает запрос.
+    Подходит для ручек, которым не нужен сам пользователь:
+    при AUTH_CLAIMS_ONLY они берутся из токена без обращения к БД.
+    '''
+    return await get_token_user_by_token(token, uow)
+
+
+async def get_stream_token_user(
+    token: str = Depends(reuseable_oauth),
+) -> TokenUser | SystemUser:
+    '''
+    То же, что get_token_user, но без сессий запроса: пользователь
+    читается в своей короткой сессии. Для потоковых ответов, иначе
+    сессия запроса держала бы соединение до конца потока.
+    '''
+    return await get_token_user_by_token(token)
+
+
+async def get_token_user_by_token(
+    token: str, uow: UnitOfWork | None = None
+) -> TokenUser | SystemUser:
+    '''
+    То же, что get_token_user, для токена не из заголовка (WebSocket).
+    Старые токены без uid проверяются через get_user_by_token.
+    '''
+    if settings.AUTH_CLAIMS_ONLY:
+        _, token_user = _verify_access_token(token)
+        if token_user is not None:
+            return token_user
+    return await get_user_by_token(token, uow)
+
+
+def _credentials_error(detail: str, status_code: int) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def verify_access_token(token: str) -> TokenPayload:
+    '''
+    Позволяет проверить access токен и получить его утверждения.
+    Проверенные утверждения кешируются по хешу токена до истечения exp,
+    поэтому подпись проверяется один раз на токен.
+    '''
+    token_data, _ = _verify_access_token(token)
+    return token_data
+
+
+def _verify_access_token(token: str) -> tuple[TokenPayload, TokenUser | None]:
+    key = hashlib.sha256(token.encode()).digest()
+    entry = token_cache.get(key)
+    if entry is not None:
+        return entry
+    try:
+        payload = jwt.decode(
+            token,
+            JWT_SECRET_KEY,
+            algorithms=[ALGORITHM],
+            options={
+                'require_exp': True,
+                'leeway': settings.JWT_LEEWAY_SECONDS,
+            },
+        )
+        token_data = TokenPayload(**payload)
+    except jwt.ExpiredSignatureError:
+        raise _credentials_error(
+            "Token expired", status.HTTP_401_UNAUTHORIZED)
+    except (jwt.JWTError, ValidationError):
+        raise _credentials_error(
+            "Could not validate credentials", status.HTTP_403_FORBIDDEN)
+    if token_data.sub is None:
+        raise _credentials_error(
+            "Could not validate credentials", status.HTTP_403_FORBIDDEN)
+    token_user = None
+    if token_data.uid is not None:
+        token_user = TokenUser(id=token_data.uid, login=token_data.sub)
+    entry = token_data, token_user
+    # exp - время UTC в секундах, как и time.time()
+    token_cache.set(
+        key,
+        entry,
+        ttl=token_data.exp + settings.JWT_LEEWAY_SECONDS - time.time(),
+    )
+    return entry
+
+
+async def get_user_by_token(
+    token: str, uow: UnitOfWork | None = None
+) -> SystemUser:
+    '''
+    Позволяет получить юзера по access токену, проверив токен.
+    Проверенные токены и пользователи кешируются в памяти процесса.
+    Без uow пользователь читается в отдельной сессии
+    (там, где нет сессии запроса, например в WebSocket).
+    '''
+    token_data = verify_access_token(token)
+
+    user_to_login = user_cache.get(token_data.sub)
+    if user_to_login is not None:
         return user_to_login
+    if uow is None:
+        async with read_session(token_data.uid) as session:
+            user_to_login = await _load_user(session, token_data.sub)
+    else:
+        user_to_login = await _load_user(
+            uow.reader(token_data.uid), token_data.sub)
+    user_cache.set(token_data.sub, user_to_login)
+    return user_to_login
+
+
+async def _load_user(session: AsyncSession, login: str) -> User:
+    query = select(User).filter_by(login=login)
+    db_user = await session.execute(query)
+    user_to_login = db_user.scalar_one_or_none()
+    if user_to_login is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find user",
+        )
+    # объект из кеша делится между запросами,
+    # поэтому он не должен быть привязан к сессии
+    session.expunge(user_to_login)
+    return user_to_login
@@ -1,7 +1,7 @@
 import datetime
 from typing import List
 
-from sqlalchemy import String
+from sqlalchemy import BigInteger, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.db import Base
@@ -11,7 +11,7 @@ class User(Base):
     __tablename__ = 'user_table'
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    login: Mapped[str] = mapped_column(String(25))
+    login: Mapped[str] = mapped_column(String(25), unique=True, index=True)
     password: Mapped[str]
     email: Mapped[str | None] = mapped_column(default=None)
     first_name: Mapped[str | None] = mapped_column(String(50), default=None)
@@ -19,5 +19,27 @@ class User(Base):
 
     registred_at: Mapped[datetime.datetime] = mapped_column(
         default=datetime.datetime.utcnow)
+    # увеличивается при каждом изменении задач пользователя
+    tasks_version: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default='0')
+    # версия задач, до которой удалены отметки об удалении:
+    # синхронизация с более старой позиции требует полной
+    tombstones_pruned_version: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default='0')
 
     task: Mapped[List['Task']] = relationship(back_populates='author')
+
+
+class RevokedToken(Base):
+    '''
+    Использованный или отозванный refresh токен.
+    Хранится до истечения самого токена.
+    '''
+
+    __tablename__ = 'revoked_token_table'
+    __table_args__ = (
+        Index('ix_revoked_token_table_expires_at', 'expires_at'),
+    )
+
+    jti: Mapped[str] = mapped_column(String(32), primary_key=True)
+    expires_at: Mapped[datetime.datetime]
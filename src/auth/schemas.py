@@ -1,6 +1,6 @@
 import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class UserBase(BaseModel):
@@ -18,8 +18,7 @@ class User(UserBase):
     id: int
     registred_at: datetime.datetime
 
-    class Config:
-        orm_model = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserUpdate(BaseModel):
@@ -36,6 +35,18 @@ class Token(BaseModel):
     refresh_token: str
 
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
+    uid: Optional[int] = None
+    jti: Optional[str] = None
+
+
+class TokenUser(BaseModel):
+    '''Пользователь, известный только по утверждениям access токена.'''
+    id: int
+    login: str
@@ -1,10 +1,19 @@
+import asyncio
 import logging
 import datetime
-from typing import Any, Union
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Union
 
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from jose import jwt
+from pydantic import ValidationError
 
+from src.auth.schemas import TokenPayload
 from src.config import settings
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -19,22 +28,91 @@ logging.getLogger('passlib').setLevel(logging.ERROR)
 
 password_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
+# bcrypt занимает сотни миллисекунд процессора, поэтому выполняется
+# в отдельном пуле, чтобы не блокировать event loop.
+# Одновременно считается не больше PASSWORD_HASH_WORKERS хешей,
+# а в очереди ждут не больше PASSWORD_HASH_QUEUE_LIMIT запросов,
+# остальные сразу получают 503.
+HASH_WORKERS = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+if settings.PASSWORD_HASH_EXECUTOR == 'process':
+    hash_executor: Executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+else:
+    hash_executor = ThreadPoolExecutor(
+        max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+_hash_semaphore = asyncio.Semaphore(HASH_WORKERS)
+_hash_waiting = 0
+# длительность последних вызовов в секундах
+hash_latency: deque[float] = deque(maxlen=1000)
+hash_rejected = 0
+
+
+def _hash(password: str) -> str:
+    return password_context.hash(password)
+
+
+def _verify(password: str, hashed_pass: str) -> bool:
+    return password_context.verify(password, hashed_pass)
+
+
+async def _run_in_hash_pool(func: Callable[..., Any], *args: Any) -> Any:
+    '''Позволяет выполнить func в пуле хеширования с учетом лимитов.'''
+    global _hash_waiting, hash_rejected
+    if _hash_waiting >= HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+        hash_rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+    _hash_waiting += 1
+    try:
+        async with _hash_semaphore:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(
+                hash_executor, func, *args)
+            hash_latency.append(time.perf_counter() - started)
+            return result
+    finally:
+        _hash_waiting -= 1
+
+
+def hash_stats() -> dict[str, float]:
+    '''Возвращает статистику пула хеширования.'''
+    samples = sorted(hash_latency)
+
+    def percentile(q: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    return {
+        'workers': HASH_WORKERS,
+        'in_flight': _hash_waiting,
+        'rejected': hash_rejected,
+        'p50': percentile(0.5),
+        'p99': percentile(0.99),
+    }
+
 
 async def get_hashed_password(password: str) -> str:
     '''Позволяет хеширывать пароль.'''
-    return password_context.hash(password)
+    return await _run_in_hash_pool(_hash, password)
 
 
 async def verify_password(password: str, hashed_pass: str) -> bool:
     '''Позволяет проверить захешированный пароль.'''
-    return password_context.verify(password, hashed_pass)
+    return await _run_in_hash_pool(_verify, password, hashed_pass)
 
 
 async def create_access_token(
     subject: Union[str, Any],
-    expires_delta: datetime.timedelta | None = None
+    expires_delta: datetime.timedelta | None = None,
+    user_id: int | None = None,
 ) -> str:
-    '''Позволяет создать access токен для пользователя.'''
+    '''
+    Позволяет создать access токен для пользователя.
+    С user_id токен позволяет узнать пользователя без запроса в БД.
+    '''
     if expires_delta is not None:
         expires_delta = datetime.datetime.utcnow() + expires_delta
     else:
@@ -42,21 +120,62 @@ async def create_access_token(
         ) + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode = {'exp': expires_delta, 'sub': str(subject)}
+    if user_id is not None:
+        to_encode['uid'] = user_id
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
 
 async def create_refresh_token(
     subject: Union[str, Any],
-    expires_delta: datetime.timedelta | None = None
+    expires_delta: datetime.timedelta | None = None,
+    user_id: int | None = None,
 ) -> str:
-    '''Позволяет создать refresh токен для пользователя.'''
+    '''
+    Позволяет создать refresh токен для пользователя.
+    У каждого токена свой jti, по которому токен отзывается после обмена.
+    '''
     if expires_delta is not None:
         expires_delta = datetime.datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.datetime.utcnow(
         ) + datetime.timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
 
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
+    to_encode = {
+        "exp": expires_delta,
+        "sub": str(subject),
+        "jti": uuid.uuid4().hex,
+    }
+    if user_id is not None:
+        to_encode['uid'] = user_id
     encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
     return encoded_jwt
+
+
+def decode_refresh_token(token: str) -> TokenPayload:
+    '''Позволяет проверить refresh токен и получить его утверждения.'''
+    try:
+        payload = jwt.decode(
+            token,
+            JWT_REFRESH_SECRET_KEY,
+            algorithms=[ALGORITHM],
+            options={
+                'require_exp': True,
+                'require_jti': True,
+                'leeway': settings.JWT_LEEWAY_SECONDS,
+            },
+        )
+        token_data = TokenPayload(**payload)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token expired",
+        )
+    except (jwt.JWTError, ValidationError):
+        token_data = None
+    if token_data is None or token_data.sub is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return token_data
@@ -1,5 +1,7 @@
 import os
+from typing import Literal
 
+from pydantic import PositiveFloat, PositiveInt
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -15,6 +17,98 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str
     JWT_REFRESH_SECRET_KEY: str
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 60 * 30
+    DB_POOL_PRE_PING: bool = True
+    # NullPool для работы за внешним пулером (PgBouncer)
+    DB_NULL_POOL: bool = False
+    # 0 отключает кеш подготовленных запросов (PgBouncer, режим transaction)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_JIT: bool = False
+    # сколько соединений открыть при старте каждого воркера
+    DB_POOL_WARMUP: int = 2
+    DB_APPLICATION_NAME: str = 'task-manager'
+
+    # реплики для чтения, например ["postgresql+asyncpg://u:p@replica/db"]
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_STRATEGY: Literal['round_robin', 'least_connections'] = (
+        'round_robin')
+    # сколько секунд после записи чтения пользователя идут в primary;
+    # запись помнит только воркер, который ее выполнил
+    DB_READ_YOUR_WRITES_SECONDS: float = 5
+
+    USER_CACHE_SIZE: int = 10_000
+    # другие воркеры узнают об изменении пользователя только
+    # с TASK_EVENTS_BACKEND=postgres, иначе видят старые данные до TTL
+    USER_CACHE_TTL: float = 15
+    TOKEN_CACHE_SIZE: int = 10_000
+    TOKEN_CACHE_TTL: float = 60 * 30
+    REVOKED_TOKENS_SIZE: int = 100_000
+    # допустимое расхождение часов при проверке exp, секунды
+    JWT_LEEWAY_SECONDS: int = 30
+    # брать id и логин пользователя из токена, не загружая пользователя
+    AUTH_CLAIMS_ONLY: bool = False
+
+    PASSWORD_HASH_EXECUTOR: Literal['thread', 'process'] = 'thread'
+    PASSWORD_HASH_WORKERS: int = 0  # 0 - по числу ядер
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
+
+    # postgres - рассылка событий между воркерами через LISTEN/NOTIFY
+    TASK_EVENTS_BACKEND: Literal['memory', 'postgres'] = 'memory'
+    TASK_STREAM_QUEUE_SIZE: int = 256
+    TASK_STREAM_KEEPALIVE: float = 15
+    # выполненные задачи, не менявшиеся столько дней, переносятся в архив
+    # командой python -m src.tasks.archive
+    TASK_ARCHIVE_AFTER_DAYS: int = 90
+    # столько дней хранятся отметки об удаленных задачах для /tasks/changes/,
+    # старые удаляются командой python -m src.tasks.tombstones
+    TASK_TOMBSTONE_RETENTION_DAYS: int = 30
+    # одинаковые одновременные запросы списка задач выполняются один раз
+    TASK_LIST_SINGLE_FLIGHT: bool = True
+    # сколько секунд переиспользовать готовую страницу списка задач;
+    # ключ включает версию задач, так что изменения из других воркеров
+    # видны сразу после чтения новой версии
+    TASK_LIST_CACHE_TTL: float = 0
+    TASK_LIST_CACHE_SIZE: int = 10_000  # пользователей
+
+    # лимиты запросов на пользователя (sub токена) или IP; включаются
+    # явно: анонимные запросы из-за одного NAT делят общий бюджет.
+    # Нулевые значения не принимаются: чтобы снять лимиты, выключите их
+    RATE_LIMIT_ENABLED: bool = False
+    # redis - общие корзины для всех воркеров, нужен пакет redis
+    RATE_LIMIT_BACKEND: Literal['memory', 'redis'] = 'memory'
+    RATE_LIMIT_REDIS_URL: str = 'redis://localhost:6379/0'
+    RATE_LIMIT_MAX_KEYS: PositiveInt = 100_000
+    RATE_LIMIT_RATE: PositiveFloat = 20  # запросов в секунду
+    RATE_LIMIT_BURST: PositiveInt = 40
+    RATE_LIMIT_CONCURRENCY: PositiveInt = 10  # одновременных запросов на воркер
+    # отдельный бюджет для регистрации, логина и обновления токенов
+    RATE_LIMIT_LOGIN_RATE: PositiveFloat = 0.2
+    RATE_LIMIT_LOGIN_BURST: PositiveInt = 5
+    RATE_LIMIT_LOGIN_CONCURRENCY: PositiveInt = 2
+
+    # параметры python -m src.server
+    SERVER_HOST: str = '0.0.0.0'
+    SERVER_PORT: int = 8001
+    SERVER_WORKERS: int = 0  # 0 - по числу ядер
+    SERVER_KEEP_ALIVE: int = 5
+    # через запятую адреса прокси, которым можно доверить X-Forwarded-For;
+    # только точные IP, '*' позволит клиентам подменять свой адрес
+    SERVER_FORWARDED_ALLOW_IPS: str = '127.0.0.1'
+    # сколько секунд после SIGTERM воркер продолжает принимать запросы,
+    # отвечая 503 на /health/ready, чтобы балансировщик успел его убрать
+    SERVER_DRAIN_SECONDS: float = 5
+    # сколько ждать завершения начатых запросов после drain
+    SERVER_GRACEFUL_TIMEOUT: float = 30
+    # сколько воркер при старте повторяет подключение к БД,
+    # прежде чем завершиться с ошибкой
+    SERVER_STARTUP_TIMEOUT: float = 60
+
+    # списки отдаются в JSON без повторной валидации моделью ответа
+    FAST_JSON_RESPONSES: bool = False
+
     @property
     def DATABASE_URL_asyncpg(self):
         return f'postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.POSTGRES_DB}'
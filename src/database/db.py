@@ -1,16 +1,192 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import asyncio
+import itertools
+import time
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from src.config import settings
 
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    '''
+    Пул соединений, который замеряет время ожидания соединения.
+    Счетчики у каждого пула свои, как и остальные его показатели.
+    '''
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+def get_engine_options(url: str) -> dict:
+    '''Собирает параметры движка для url из настроек.'''
+    options = {
+        'echo': False,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+    if url.startswith('postgresql+asyncpg'):
+        options['connect_args'] = get_asyncpg_connect_args()
+    if settings.DB_NULL_POOL:
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def get_asyncpg_connect_args() -> dict:
+    '''Собирает параметры подключения asyncpg из настроек.'''
+    server_settings = {'application_name': settings.DB_APPLICATION_NAME}
+    if not settings.DB_JIT:
+        server_settings['jit'] = 'off'
+    connect_args = {
+        'server_settings': server_settings,
+        'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+        'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_STATEMENT_CACHE_SIZE == 0:
+        # за PgBouncer в режиме transaction имена подготовленных
+        # запросов должны быть уникальными между соединениями
+        connect_args['prepared_statement_name_func'] = (
+            lambda: f'__asyncpg_{uuid4()}__')
+    return connect_args
+
+
 async_engine = create_async_engine(
     url=settings.DATABASE_URL_asyncpg,
-    echo=False,
+    **get_engine_options(settings.DATABASE_URL_asyncpg),
 )
 
 async_session_factory = async_sessionmaker(async_engine)
 
+replica_engines = [
+    create_async_engine(url=url, **get_engine_options(url))
+    for url in settings.DB_REPLICA_URLS
+]
+_replica_cycle = itertools.cycle(range(len(replica_engines)))
+# user id -> момент, до которого чтения этого пользователя идут в primary
+_recent_writes: dict[int, float] = {}
+RECENT_WRITES_MAX = 10_000
+
+
+def mark_write(user_id: int) -> None:
+    '''
+    Отмечает запись пользователя, чтобы его следующие чтения
+    какое-то время шли в primary и видели собственные изменения.
+    '''
+    if not replica_engines or settings.DB_READ_YOUR_WRITES_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if len(_recent_writes) > RECENT_WRITES_MAX:
+        for key, deadline in list(_recent_writes.items()):
+            if deadline <= now:
+                del _recent_writes[key]
+    _recent_writes[user_id] = now + settings.DB_READ_YOUR_WRITES_SECONDS
+
+
+def wrote_recently(user_id: int) -> bool:
+    '''Проверяет, должны ли чтения пользователя сейчас идти в primary.'''
+    deadline = _recent_writes.get(user_id)
+    if deadline is None:
+        return False
+    if deadline <= time.monotonic():
+        del _recent_writes[user_id]
+        return False
+    return True
+
+
+def choose_read_engine(user_id: int | None = None) -> AsyncEngine:
+    '''Выбирает движок для чтения: реплику или primary.'''
+    if not replica_engines:
+        return async_engine
+    if user_id is not None and wrote_recently(user_id):
+        return async_engine
+    if settings.DB_REPLICA_STRATEGY == 'least_connections':
+        return min(
+            replica_engines,
+            key=lambda engine: getattr(engine.pool, 'checkedout', int)(),
+        )
+    return replica_engines[next(_replica_cycle)]
+
+
+def read_session(user_id: int | None = None) -> AsyncSession:
+    '''
+    Позволяет открыть сессию только для чтения.
+    Если настроены реплики, запросы уходят в одну из них.
+    '''
+    return async_session_factory(bind=choose_read_engine(user_id))
+
+
+async def warm_up_engines(connections: int) -> None:
+    '''
+    Открывает заранее до connections соединений в пуле каждого движка,
+    чтобы первые запросы не ждали установки соединения.
+    '''
+    if settings.DB_NULL_POOL or connections <= 0:
+        return
+    for engine in (async_engine, *replica_engines):
+        count = min(connections, settings.DB_POOL_SIZE)
+        opened = await asyncio.gather(
+            *(engine.connect() for _ in range(count)))
+        # закрытые соединения возвращаются в пул открытыми
+        await asyncio.gather(*(connection.close() for connection in opened))
+
+
+async def dispose_engines() -> None:
+    '''Закрывает все соединения primary и реплик.'''
+    for engine in (async_engine, *replica_engines):
+        await engine.dispose()
+
+
+def get_pool_status() -> dict[str, dict[str, float]]:
+    '''
+    Возвращает текущее состояние пулов соединений по движкам:
+    primary и replica0, replica1, ... в порядке DB_REPLICA_URLS.
+    '''
+    engines = {'primary': async_engine}
+    for number, engine in enumerate(replica_engines):
+        engines[f'replica{number}'] = engine
+    status = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        if not isinstance(pool, TimedQueuePool):
+            continue
+        status[name] = {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'wait_count': pool.wait_count,
+            'wait_seconds_total': pool.wait_total,
+            'wait_seconds_max': pool.wait_max,
+        }
+    return status
+
 
 class Base(DeclarativeBase):
     pass
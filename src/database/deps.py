@@ -0,0 +1,96 @@
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.database.db import (
+    async_engine,
+    async_session_factory,
+    choose_read_engine,
+    wrote_recently,
+)
+
+
+class UnitOfWork:
+    '''
+    Сессии БД одного запроса, общие для зависимостей и обработчика.
+    Сессии создаются при первом обращении, а соединение из пула
+    берется только при первом запросе к БД, поэтому запрос,
+    обслуженный из кеша, пул не трогает.
+    '''
+
+    def __init__(self) -> None:
+        self._sessions: dict[AsyncEngine, AsyncSession] = {}
+        self._reader: AsyncSession | None = None
+
+    @property
+    def session(self) -> AsyncSession:
+        '''Сессия primary, через нее выполняются изменения.'''
+        return self._get(async_engine)
+
+    def reader(self, user_id: int | None = None) -> AsyncSession:
+        '''
+        Сессия для чтения. Если в запросе уже идет транзакция в primary,
+        чтение выполняется в ней же, на том же соединении. Иначе
+        выбирается реплика, как в read_session, одна на весь запрос.
+        Если user_id недавно писал, чтение переключается на primary,
+        даже когда реплика уже выбрана раньше (например, без user_id).
+        '''
+        primary = self._sessions.get(async_engine)
+        if primary is not None and primary.in_transaction():
+            return primary
+        if self._reader is None:
+            self._reader = self._get(choose_read_engine(user_id))
+        elif (
+            user_id is not None
+            and self._reader.bind is not async_engine
+            and wrote_recently(user_id)
+        ):
+            self._reader = self.session
+        return self._reader
+
+    def _get(self, engine: AsyncEngine) -> AsyncSession:
+        session = self._sessions.get(engine)
+        if session is None:
+            session = self._sessions[engine] = async_session_factory(
+                bind=engine)
+        return session
+
+    async def commit(self) -> None:
+        for session in self._sessions.values():
+            if session.in_transaction():
+                await session.commit()
+
+    async def rollback(self) -> None:
+        for session in self._sessions.values():
+            if session.in_transaction():
+                await session.rollback()
+
+    async def release(self) -> None:
+        '''
+        Возвращает соединения в пул до конца запроса, например
+        перед долгим хешированием пароля. Незавершенные транзакции
+        откатываются, сессиями можно продолжать пользоваться.
+        '''
+        for session in self._sessions.values():
+            await session.close()
+
+    async def close(self) -> None:
+        await self.release()
+        self._sessions.clear()
+        self._reader = None
+
+
+async def get_unit_of_work() -> AsyncIterator[UnitOfWork]:
+    '''
+    Зависимость с сессиями запроса. Если обработчик завершился
+    без ошибки, незакоммиченные изменения коммитятся, иначе откатываются.
+    '''
+    uow = UnitOfWork()
+    try:
+        yield uow
+        await uow.commit()
+    except Exception:
+        await uow.rollback()
+        raise
+    finally:
+        await uow.close()
@@ -0,0 +1,61 @@
+from functools import lru_cache
+from typing import Any, List
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+
+def parse_fields(
+    fields: str | None, model: type[BaseModel]
+) -> tuple[str, ...]:
+    '''
+    Разбирает параметр fields=id,is_done и проверяет имена по полям модели.
+    Возвращает поля в порядке модели, без параметра - все поля.
+    '''
+    allowed = tuple(model.model_fields)
+    if fields is None:
+        return allowed
+    names = {name.strip() for name in fields.split(',')} - {''}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                   f"Allowed: {', '.join(allowed)}",
+        )
+    if not names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields requested",
+        )
+    return tuple(name for name in allowed if name in names)
+
+
+@lru_cache(maxsize=256)
+def list_adapter(
+    model: type[BaseModel], fields: tuple[str, ...]
+) -> TypeAdapter:
+    '''
+    Возвращает TypeAdapter списка модели, сокращенной до полей fields.
+    Модели создаются один раз на набор полей.
+    '''
+    if fields == tuple(model.model_fields):
+        return TypeAdapter(List[model])
+    partial = create_model(
+        f"{model.__name__}_{'_'.join(fields)}",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (model.model_fields[name].annotation, ...)
+            for name in fields
+        },
+    )
+    return TypeAdapter(List[partial])
+
+
+def list_json(
+    model: type[BaseModel], fields: tuple[str, ...], rows: Any
+) -> bytes:
+    '''Сериализует строки в JSON список модели, сокращенной до полей fields.'''
+    adapter = list_adapter(model, fields)
+    return adapter.dump_json(
+        adapter.validate_python(rows, from_attributes=True))
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Response, status
+
+
+router = APIRouter(tags=['health'])
+
+
+class HealthState:
+    '''
+    Состояние воркера для проб балансировщика.
+    ready выставляется после прогрева в lifespan
+    и снимается в начале плавной остановки.
+    '''
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.draining = False
+
+    def start_draining(self) -> None:
+        self.ready = False
+        self.draining = True
+
+
+health = HealthState()
+
+
+@router.get('/live')
+async def liveness() -> dict[str, str]:
+    '''Проба живости: процесс отвечает на запросы.'''
+    return {'status': 'ok'}
+
+
+@router.get('/ready')
+async def readiness(response: Response) -> dict[str, str]:
+    '''
+    Проба готовности: воркер прогрет и не останавливается.
+    Во время плавной остановки возвращает 503.
+    '''
+    if health.ready:
+        return {'status': 'ready'}
+    response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {'status': 'draining' if health.draining else 'starting'}
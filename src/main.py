@@ -1,11 +1,72 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable
+
 from fastapi import FastAPI
+from sqlalchemy.exc import SQLAlchemyError
 import uvicorn
 
-from src.auth.crud import router as user_router
+from src.auth.crud import load_revoked_tokens, router as user_router
+from src.config import settings
+from src.database.db import dispose_engines, warm_up_engines
+from src.health.router import health, router as health_router
+from src.metrics.middleware import MetricsMiddleware
+from src.metrics.router import router as metrics_router
+from src.ratelimit.middleware import RateLimitMiddleware
 from src.tasks.crud import router as task_router
+from src.tasks.events import task_events_backend
+
+
+logger = logging.getLogger('uvicorn.error')
+
+
+async def retry_startup(
+    name: str, step: Callable[[], Awaitable[None]]
+) -> None:
+    '''
+    Выполняет шаг запуска, повторяя его с растущей паузой, пока БД
+    недоступна или еще не мигрирована, но не дольше SERVER_STARTUP_TIMEOUT.
+    '''
+    deadline = time.monotonic() + settings.SERVER_STARTUP_TIMEOUT
+    delay = 0.5
+    while True:
+        try:
+            await step()
+            return
+        except (OSError, SQLAlchemyError) as exc:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning(
+                'Startup step %s failed: %s. Retrying in %.1f seconds',
+                name, exc, delay,
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 10)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await retry_startup(
+        'warm_up_engines', lambda: warm_up_engines(settings.DB_POOL_WARMUP))
+    await retry_startup('load_revoked_tokens', load_revoked_tokens)
+    # LISTEN нужен сразу, чтобы получать сбросы кеша пользователей
+    await retry_startup('task_events_backend', task_events_backend.start)
+    health.ready = True
+    yield
+    health.start_draining()
+    await task_events_backend.stop()
+    await dispose_engines()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# добавленное позже middleware выполняется раньше,
+# поэтому ответы 429 тоже попадают в метрики
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.include_router(metrics_router)
+app.include_router(health_router, prefix='/health')
 app.include_router(user_router, prefix='/users')
 app.include_router(task_router, prefix='/tasks')
 
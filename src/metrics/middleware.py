@@ -0,0 +1,157 @@
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.db import async_engine, replica_engines
+from src.metrics.registry import Counter, Gauge, Histogram, registry
+
+
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 50, 100)
+NO_ROUTE = '<unmatched>'
+
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds',
+    'Длительность HTTP запросов.',
+    labelnames=('method', 'route', 'status'),
+))
+requests_in_flight = registry.register(Gauge(
+    'http_requests_in_flight',
+    'Количество обрабатываемых сейчас HTTP запросов.',
+    labelnames=('method',),
+))
+request_queries = registry.register(Histogram(
+    'http_request_db_queries',
+    'Количество запросов к БД на один HTTP запрос.',
+    labelnames=('method', 'route'),
+    buckets=QUERY_BUCKETS,
+))
+request_db_duration = registry.register(Histogram(
+    'http_request_db_duration_seconds',
+    'Суммарное время запросов к БД на один HTTP запрос.',
+    labelnames=('method', 'route'),
+))
+query_duration = registry.register(Histogram(
+    'db_query_duration_seconds',
+    'Длительность запросов к БД по виду запроса.',
+    labelnames=('statement', 'route'),
+))
+query_errors = registry.register(Counter(
+    'db_query_errors_total',
+    'Количество запросов к БД, завершившихся ошибкой.',
+    labelnames=('statement', 'route'),
+))
+
+
+@dataclass
+class RequestStats:
+    scope: Scope
+    queries: int = 0
+    db_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        '''Шаблон маршрута, например /tasks/{task_id}/.'''
+        route = self.scope.get('route')
+        return route.path if route is not None else NO_ROUTE
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    'request_stats', default=None)
+
+_STATEMENT_TABLE = re.compile(
+    r'\b(?:FROM|INTO|UPDATE|JOIN)\s+"?(\w+)', re.IGNORECASE)
+
+
+def statement_shape(statement: str) -> str:
+    '''
+    Сводит текст запроса к виду "<команда> <таблица>",
+    чтобы число значений метки оставалось небольшим.
+    '''
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement else ''
+    table = _STATEMENT_TABLE.search(statement)
+    return f'{verb} {table.group(1)}' if table else verb
+
+
+def _query_finished(context, failed: bool = False) -> None:
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = request_stats.get()
+    route = stats.route if stats is not None else NO_ROUTE
+    shape = statement_shape(context.statement or '')
+    if failed:
+        query_errors.inc(shape, route)
+    query_duration.observe(shape, route, value=elapsed)
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    _query_finished(context)
+
+
+def _handle_error(exception_context):
+    if exception_context.execution_context is not None:
+        _query_finished(exception_context.execution_context, failed=True)
+
+
+for engine in (async_engine, *replica_engines):
+    event.listen(
+        engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(
+        engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine.sync_engine, 'handle_error', _handle_error)
+
+
+class MetricsMiddleware:
+    '''
+    ASGI middleware, которое собирает длительность запросов,
+    число обрабатываемых запросов и время работы с БД по шаблону маршрута.
+    '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        stats = RequestStats(scope)
+        token = request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        requests_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec(method)
+            route = stats.route
+            request_duration.observe(
+                method, route, status_code,
+                value=time.perf_counter() - started,
+            )
+            request_queries.observe(method, route, value=stats.queries)
+            request_db_duration.observe(method, route, value=stats.db_seconds)
+            request_stats.reset(token)
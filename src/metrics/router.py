@@ -0,0 +1,73 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.auth.cache import revoked_tokens, token_cache, user_cache
+from src.auth.utils import hash_stats
+from src.database.db import get_pool_status
+from src.metrics.registry import GaugeCallback, registry
+from src.ratelimit.middleware import rate_limit_stats
+from src.tasks.cache import task_lists
+from src.tasks.events import task_hub
+
+
+router = APIRouter(tags=['metrics'])
+
+registry.register(GaugeCallback(
+    'db_pool',
+    'Состояние пулов соединений с primary и репликами БД.',
+    lambda: {
+        (engine, key): value
+        for engine, pool_status in get_pool_status().items()
+        for key, value in pool_status.items()
+    },
+    labelnames=('engine', 'stat'),
+))
+registry.register(GaugeCallback(
+    'auth_cache',
+    'Счетчики кешей пользователей, токенов и отозванных токенов.',
+    lambda: {
+        (name, key): value
+        for name, cache in (
+            ('user', user_cache),
+            ('token', token_cache),
+            ('revoked', revoked_tokens),
+        )
+        for key, value in cache.stats().items()
+    },
+    labelnames=('cache', 'stat'),
+))
+registry.register(GaugeCallback(
+    'password_hash',
+    'Состояние пула хеширования паролей.',
+    lambda: {(key,): value for key, value in hash_stats().items()},
+    labelnames=('stat',),
+))
+
+registry.register(GaugeCallback(
+    'task_events',
+    'Состояние раздачи событий задач по WebSocket/SSE.',
+    lambda: {(key,): value for key, value in task_hub.stats().items()},
+    labelnames=('stat',),
+))
+registry.register(GaugeCallback(
+    'task_list_flights',
+    'Объединение одинаковых запросов списка задач: '
+    'доля (shared + cached) / (leaders + shared + cached) - попадания.',
+    lambda: {(key,): value for key, value in task_lists.stats().items()},
+    labelnames=('stat',),
+))
+registry.register(GaugeCallback(
+    'rate_limit',
+    'Состояние ограничителя запросов.',
+    lambda: {(key,): value for key, value in rate_limit_stats().items()},
+    labelnames=('stat',),
+))
+
+
+@router.get('/metrics')
+async def get_metrics() -> PlainTextResponse:
+    '''Выгружает метрики приложения в текстовом формате Prometheus.'''
+    return PlainTextResponse(
+        registry.render(),
+        media_type='text/plain; version=0.0.4; charset=utf-8',
+    )
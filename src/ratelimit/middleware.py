@@ -0,0 +1,130 @@
+import math
+
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.auth.deps import verify_access_token
+from src.config import settings
+from src.metrics.registry import Counter, registry
+from src.ratelimit.store import rate_limit_store
+
+
+DEFAULT_GROUP = 'default'
+LOGIN_GROUP = 'login'
+# дорогие ручки с bcrypt или выпуском токенов
+LOGIN_PATHS = {'/users/', '/users/login/', '/users/refresh/'}
+EXEMPT_PATHS = {'/metrics', '/health/live', '/health/ready'}
+# долгие потоки не должны занимать лимит одновременных запросов
+STREAM_PATHS = {'/tasks/events/'}
+
+rate_limited = registry.register(Counter(
+    'rate_limit_requests_total',
+    'Решения ограничителя запросов.',
+    labelnames=('group', 'result'),
+))
+
+# (группа, ключ) -> число запросов в обработке в этом воркере
+_in_flight: dict[tuple[str, str], int] = {}
+
+
+def get_budget(group: str) -> tuple[float, int, int]:
+    '''Возвращает (запросов в секунду, burst, одновременных) для группы.'''
+    if group == LOGIN_GROUP:
+        return (
+            settings.RATE_LIMIT_LOGIN_RATE,
+            settings.RATE_LIMIT_LOGIN_BURST,
+            settings.RATE_LIMIT_LOGIN_CONCURRENCY,
+        )
+    return (
+        settings.RATE_LIMIT_RATE,
+        settings.RATE_LIMIT_BURST,
+        settings.RATE_LIMIT_CONCURRENCY,
+    )
+
+
+def client_key(scope: Scope) -> str:
+    '''
+    Ключ лимита: логин из проверенного access токена, иначе IP клиента.
+    Проверенные токены берутся из кеша, поэтому это дешево.
+    '''
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() == 'bearer' and token:
+                try:
+                    return f'user:{verify_access_token(token).sub}'
+                except HTTPException:
+                    pass
+            break
+    client = scope.get('client')
+    return f'ip:{client[0] if client else "unknown"}'
+
+
+def rate_limit_stats() -> dict[str, int]:
+    return {
+        'keys_in_flight': len(_in_flight),
+        **rate_limit_store.stats(),
+    }
+
+
+class RateLimitMiddleware:
+    '''
+    ASGI middleware, которое ограничивает частоту (token bucket)
+    и число одновременных запросов каждого пользователя.
+    При превышении отвечает 429 с заголовком Retry-After.
+    '''
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get('path', '')
+        if (
+            scope['type'] != 'http'
+            or not settings.RATE_LIMIT_ENABLED
+            or path in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+        if scope['method'] == 'POST' and path in LOGIN_PATHS:
+            group = LOGIN_GROUP
+            client = scope.get('client')
+            key = f'ip:{client[0] if client else "unknown"}'
+        else:
+            group = DEFAULT_GROUP
+            key = client_key(scope)
+        rate, burst, concurrency = get_budget(group)
+
+        wait = await rate_limit_store.acquire(f'{group}:{key}', rate, burst)
+        if wait > 0:
+            rate_limited.inc(group, 'rate_limited')
+            await self.reject(scope, receive, send, wait)
+            return
+        if path in STREAM_PATHS:
+            rate_limited.inc(group, 'allowed')
+            await self.app(scope, receive, send)
+            return
+        slot = (group, key)
+        if _in_flight.get(slot, 0) >= concurrency:
+            rate_limited.inc(group, 'concurrency_limited')
+            await self.reject(scope, receive, send, 1)
+            return
+        rate_limited.inc(group, 'allowed')
+        _in_flight[slot] = _in_flight.get(slot, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight[slot] -= 1
+            if not _in_flight[slot]:
+                del _in_flight[slot]
+
+    async def reject(
+        self, scope: Scope, receive: Receive, send: Send, wait: float
+    ) -> None:
+        response = JSONResponse(
+            {'detail': 'Too many requests'},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(max(1, math.ceil(wait)))},
+        )
+        await response(scope, receive, send)
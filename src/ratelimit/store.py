@@ -0,0 +1,107 @@
+import time
+
+from src.config import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis - необязательная зависимость
+    redis = None
+
+
+class MemoryStore:
+    '''
+    Хранилище token bucket в памяти процесса.
+    Каждое обращение к корзине выполняется без await, поэтому
+    внутри event loop оно атомарно и блокировки не нужны.
+    Лимиты считаются отдельно в каждом воркере.
+    '''
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        # ключ -> [токены, время последнего пополнения, время заполнения]
+        self._buckets: dict[str, list[float]] = {}
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        '''
+        Забирает токен из корзины key.
+        Возвращает 0, если токен получен, иначе через сколько секунд
+        он появится.
+        '''
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.maxsize:
+                self._prune(now)
+            bucket = self._buckets[key] = [burst, now, now]
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        if tokens < 1:
+            bucket[0], bucket[1] = tokens, now
+            return (1 - tokens) / rate
+        tokens -= 1
+        bucket[0], bucket[1] = tokens, now
+        # после этого момента корзина снова полная и ее можно забыть
+        bucket[2] = now + (burst - tokens) / rate
+        return 0
+
+    def _prune(self, now: float) -> None:
+        for key, bucket in list(self._buckets.items()):
+            if bucket[2] <= now:
+                del self._buckets[key]
+        while len(self._buckets) >= self.maxsize:
+            # все корзины активны - вытесняем самую старую
+            del self._buckets[next(iter(self._buckets))]
+
+    def stats(self) -> dict[str, int]:
+        return {'buckets': len(self._buckets)}
+
+
+# KEYS[1] - корзина, ARGV - rate, burst, текущее время в секундах
+REDIS_ACQUIRE = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return tostring(wait)
+'''
+
+
+class RedisStore:
+    '''
+    Хранилище token bucket в Redis, общее для всех воркеров.
+    Корзина обновляется одним Lua скриптом, поэтому атомарно.
+    '''
+
+    def __init__(self, url: str) -> None:
+        if redis is None:
+            raise RuntimeError(
+                'RATE_LIMIT_BACKEND=redis requires the redis package')
+        self._client = redis.from_url(url)
+        self._acquire = self._client.register_script(REDIS_ACQUIRE)
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        wait = await self._acquire(
+            keys=[f'ratelimit:{key}'], args=[rate, burst, time.time()])
+        return float(wait)
+
+    def stats(self) -> dict[str, int]:
+        return {}
+
+
+def create_store() -> MemoryStore | RedisStore:
+    if settings.RATE_LIMIT_BACKEND == 'redis':
+        return RedisStore(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryStore(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limit_store = create_store()
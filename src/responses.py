@@ -0,0 +1,40 @@
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import JSONResponse
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    '''
+    JSON ответ без повторной валидации и jsonable_encoder.
+    Кодирует через orjson, если он установлен, иначе через pydantic_core.
+    Содержимое должно состоять из dict/list/str/int/bool/datetime.
+    '''
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return pydantic_core.to_json(content)
+
+
+def rows_response(
+    rows: Iterable[Any],
+    fields: Sequence[str] | None = None,
+    **kwargs: Any,
+) -> FastJSONResponse:
+    '''
+    Позволяет отдать строки запроса select(колонки) сразу в JSON,
+    минуя валидацию модели ответа FastAPI.
+    С fields в ответ попадают только эти колонки.
+    '''
+    if fields is None:
+        return FastJSONResponse([row._asdict() for row in rows], **kwargs)
+    return FastJSONResponse(
+        [{name: row._mapping[name] for name in fields} for row in rows],
+        **kwargs,
+    )
@@ -0,0 +1,134 @@
+'''
+Запуск сервера в production:
+
+    python -m src.server
+
+Поднимает по воркеру на ядро (SERVER_WORKERS), использует uvloop
+и httptools, если они установлены. По SIGTERM воркер сначала
+SERVER_DRAIN_SECONDS продолжает обслуживать запросы, отвечая 503
+на /health/ready, и только потом перестает принимать соединения
+и ждет завершения начатых запросов. Воркеры останавливаются
+одновременно, поэтому остановка занимает не дольше
+SERVER_DRAIN_SECONDS + SERVER_GRACEFUL_TIMEOUT (+ запас на lifespan)
+независимо от их числа.
+'''
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import time
+from types import FrameType
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.config import settings
+from src.health.router import health
+
+
+logger = logging.getLogger('uvicorn.error')
+# время на lifespan shutdown воркера после завершения запросов
+SHUTDOWN_MARGIN_SECONDS = 2
+WORKER_CHECK_SECONDS = 1
+STARTUP_FAILURE = 3  # как у uvicorn
+
+
+class DrainingServer(uvicorn.Server):
+    '''Сервер uvicorn, который перед остановкой выводит воркер из балансировки.'''
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        if health.draining or settings.SERVER_DRAIN_SECONDS <= 0:
+            # повторный сигнал останавливает сервер сразу
+            return super().handle_exit(sig, frame)
+        health.start_draining()
+        logger.info(
+            'Draining for %s seconds before shutdown [%s]',
+            settings.SERVER_DRAIN_SECONDS, os.getpid(),
+        )
+        asyncio.get_running_loop().call_later(
+            settings.SERVER_DRAIN_SECONDS, super().handle_exit, sig, frame)
+
+
+class Supervisor(Multiprocess):
+    '''
+    Multiprocess, который останавливает воркеры одновременно:
+    uvicorn ждет каждый воркер по очереди, и drain длился бы
+    число воркеров * SERVER_DRAIN_SECONDS. Если воркер завершился
+    сам (например, не смог стартовать без БД), останавливает
+    остальные и выходит с ненулевым кодом, чтобы контейнер перезапустили.
+    '''
+
+    def run(self) -> None:
+        self.startup()
+        while not self.should_exit.wait(WORKER_CHECK_SECONDS):
+            for process in self.processes:
+                if not process.is_alive():
+                    logger.error(
+                        'Worker [%s] exited with code %s, stopping',
+                        process.pid, process.exitcode,
+                    )
+                    self.shutdown()
+                    sys.exit(STARTUP_FAILURE)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        deadline = time.monotonic() + get_shutdown_timeout()
+        for process in self.processes:
+            process.join(max(deadline - time.monotonic(), 0))
+        for process in self.processes:
+            if process.is_alive():
+                logger.warning(
+                    'Worker [%s] did not stop in time, killing', process.pid)
+                process.kill()
+                process.join()
+        logger.info('Stopping parent process [%s]', self.pid)
+
+
+def get_shutdown_timeout() -> float:
+    '''Сколько ждать воркеры после SIGTERM, прежде чем убить их.'''
+    return (
+        settings.SERVER_DRAIN_SECONDS
+        + settings.SERVER_GRACEFUL_TIMEOUT
+        + SHUTDOWN_MARGIN_SECONDS
+    )
+
+
+def get_workers() -> int:
+    return settings.SERVER_WORKERS or os.cpu_count() or 1
+
+
+def get_config() -> uvicorn.Config:
+    has_uvloop = importlib.util.find_spec('uvloop') is not None
+    has_httptools = importlib.util.find_spec('httptools') is not None
+    return uvicorn.Config(
+        'src.main:app',
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=get_workers(),
+        loop='uvloop' if has_uvloop else 'asyncio',
+        http='httptools' if has_httptools else 'h11',
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        access_log=False,
+    )
+
+
+def main() -> None:
+    config = get_config()
+    server = DrainingServer(config=config)
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Supervisor(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+        if not server.started:
+            sys.exit(STARTUP_FAILURE)
+
+
+if __name__ == '__main__':
+    main()
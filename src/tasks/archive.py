@@ -0,0 +1,156 @@
+'''
+Перенос старых выполненных задач в task_archive_table.
+
+Выполненные задачи, которые не менялись TASK_ARCHIVE_AFTER_DAYS дней,
+удаляются из task_table и сохраняются в архиве, откуда их можно
+получить через GET /tasks/?include_archived=true. Для синхронизации
+(/tasks/changes/) архивирование выглядит как удаление: на месте задач
+остаются отметки об удалении. Счетчики задач архивные задачи
+по-прежнему учитывают. Команду можно запускать
+по расписанию:
+
+    python -m src.tasks.archive run [--older-than-days N] [--user-id ID] \\
+        [--batch-size N]
+'''
+import argparse
+import asyncio
+import datetime
+from typing import Sequence
+
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.config import settings
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import Task, TaskArchive, TaskTombstone
+
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_COLUMNS = (
+    'id', 'author_id', 'text', 'created_at', 'updated_at', 'is_done',
+    'version',
+)
+
+
+async def archive_tasks(
+    session: AsyncSession, user_ids: Sequence[int], before: datetime.datetime
+) -> dict[int, int]:
+    '''
+    Переносит в архив выполненные задачи пользователей, не менявшиеся
+    с before, одним запросом WITH moved AS (DELETE ... RETURNING) INSERT,
+    который заодно оставляет отметки об удалении с новой версией задач.
+    Строки пользователей блокируются, как в bump_tasks_version, а версия
+    задач увеличивается, чтобы ETag списков задач изменился.
+    Возвращает число перенесенных задач по пользователям.
+    '''
+    await session.execute(
+        select(User.id)
+        .where(User.id.in_(user_ids))
+        .order_by(User.id)
+        .with_for_update()
+    )
+    now = datetime.datetime.utcnow()
+    moved = (
+        delete(Task)
+        .where(
+            Task.author_id.in_(user_ids),
+            Task.is_done,
+            Task.updated_at < before,
+        )
+        .returning(*(Task.__table__.c[name] for name in ARCHIVE_COLUMNS))
+        .cte('moved')
+    )
+    archived = (
+        insert(TaskArchive)
+        .from_select(
+            [*ARCHIVE_COLUMNS, 'archived_at'],
+            select(
+                *(moved.c[name] for name in ARCHIVE_COLUMNS),
+                literal(now),
+            ),
+        )
+        .cte('archived')
+    )
+    # строки пользователей заблокированы выше, поэтому версия,
+    # прочитанная здесь, совпадет с увеличенной ниже
+    tombstones = (
+        insert(TaskTombstone)
+        .from_select(
+            ['task_id', 'author_id', 'version', 'deleted_at'],
+            select(
+                moved.c.id,
+                moved.c.author_id,
+                User.tasks_version + 1,
+                literal(now),
+            ).join(User, User.id == moved.c.author_id),
+        )
+        .cte('tombstones')
+    )
+    result = await session.execute(
+        select(moved.c.author_id, func.count())
+        .group_by(moved.c.author_id)
+        .add_cte(moved, archived, tombstones)
+    )
+    counts = dict(result.all())
+    if counts:
+        await session.execute(
+            update(User)
+            .where(User.id.in_(counts))
+            .values(tasks_version=User.tasks_version + 1)
+        )
+    return counts
+
+
+async def archive_all(
+    older_than_days: int,
+    user_id: int | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> None:
+    '''
+    Архивирует задачи пользователя user_id
+    или всех пользователей порциями по batch_size.
+    '''
+    before = datetime.datetime.utcnow() - datetime.timedelta(
+        days=older_than_days)
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session_factory() as session:
+            if user_id is not None:
+                user_ids = [] if last_id else [user_id]
+            else:
+                user_ids = (await session.execute(
+                    select(User.id)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )).scalars().all()
+            if not user_ids:
+                break
+            counts = await archive_tasks(session, user_ids, before)
+            await session.commit()
+        last_id = user_ids[-1]
+        total += sum(counts.values())
+        print(f'archived {total} tasks up to user {last_id}')
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Task archive maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser(
+        'run', help='move old completed tasks to the archive')
+    run.add_argument(
+        '--older-than-days', type=int,
+        default=settings.TASK_ARCHIVE_AFTER_DAYS)
+    run.add_argument('--user-id', type=int)
+    run.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.command == 'run':
+        asyncio.run(archive_all(
+            args.older_than_days, args.user_id, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from src.auth.cache import TTLCache
+from src.config import settings
+
+
+class SingleFlight:
+    '''
+    Объединяет одинаковые одновременные вычисления: пока первое
+    выполняется, остальные с тем же ключом ждут его результат.
+    Успешный результат можно переиспользовать еще ttl секунд.
+    Ключи сгруппированы (по пользователю), чтобы сбрасывать их разом.
+    '''
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.ttl = ttl
+        self._flights: dict[Hashable, dict[Hashable, asyncio.Future]] = {}
+        # группа -> {ключ: (истекает, результат)}
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.leaders = 0
+        self.shared = 0
+        self.cached = 0
+        self.invalidations = 0
+
+    async def run(
+        self,
+        group: Hashable,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        '''
+        Возвращает результат func для ключа: готовый, если он еще
+        не устарел, общий с уже идущим вычислением или новый.
+        Исключение func получают все ожидающие, но оно не сохраняется.
+        '''
+        while True:
+            results = self._results.get(group) if self.ttl > 0 else None
+            if results is not None:
+                entry = results.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.cached += 1
+                    return entry[1]
+            future = self._flights.get(group, {}).get(key)
+            if future is None:
+                return await self._lead(group, key, func)
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # отменен запрос, который выполнял вычисление, а не этот:
+                # повторяем сами
+                if future.cancelled():
+                    continue
+                raise
+
+    async def _lead(
+        self,
+        group: Hashable,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._flights.setdefault(group, {})[key] = future
+        self.leaders += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # ожидающих может не быть, помечаем исключение полученным
+            future.exception()
+            raise
+        finally:
+            flights = self._flights.get(group, {})
+            # после invalidate здесь может быть уже другое вычисление
+            current = flights.get(key) is future
+            if current:
+                del flights[key]
+                if not flights:
+                    del self._flights[group]
+        future.set_result(result)
+        if current:
+            self._remember(group, key, result)
+        return result
+
+    def _remember(self, group: Hashable, key: Hashable, result: Any) -> None:
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        results = {
+            result_key: entry
+            for result_key, entry in (self._results.get(group) or {}).items()
+            if entry[0] > now
+        }
+        results[key] = (now + self.ttl, result)
+        self._results.set(group, results)
+
+    def invalidate(self, group: Hashable) -> None:
+        '''
+        Сбрасывает результаты группы. Уже идущие вычисления досчитываются
+        для своих ожидающих, но новые запросы к ним не присоединяются.
+        '''
+        self._flights.pop(group, None)
+        self._results.invalidate(group)
+        self.invalidations += 1
+
+    def stats(self) -> dict[str, int]:
+        '''
+        Возвращает число вычислений (leaders), запросов, получивших
+        результат идущего (shared) или сохраненного (cached) вычисления,
+        и сбросов.
+        '''
+        return {
+            'in_flight': sum(map(len, self._flights.values())),
+            'groups': self._results.stats()['size'],
+            'leaders': self.leaders,
+            'shared': self.shared,
+            'cached': self.cached,
+            'invalidations': self.invalidations,
+        }
+
+
+task_lists = SingleFlight(
+    maxsize=settings.TASK_LIST_CACHE_SIZE, ttl=settings.TASK_LIST_CACHE_TTL)
@@ -1,128 +1,959 @@
+import asyncio
 import datetime
-from typing import List
+import json
+from dataclasses import dataclass
+from typing import List, Literal
 
-from fastapi import APIRouter
-from fastapi import Depends, HTTPException, Response, status
-from sqlalchemy import and_, select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    String,
+    and_,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    null,
+    or_,
+    select,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import FromClause
 
-from src.database.db import async_session_factory
-from src.tasks.models import Task
+from src.config import settings
+from src.fields import list_json, parse_fields
+from src.responses import rows_response
+from src.database.db import mark_write, read_session
+from src.database.deps import UnitOfWork, get_unit_of_work
+from src.tasks.models import (
+    SEARCH_CONFIG,
+    Task,
+    TaskArchive,
+    TaskTombstone,
+    UserTaskDailyStats,
+    UserTaskStats,
+)
 import src.tasks.schemas as schemas
-from src.auth.deps import get_current_user
-from src.auth.schemas import User
+from src.tasks.cache import task_lists
+from src.tasks.events import publish_task_events, subscribe, task_event
+from src.tasks.stats import (
+    created_changes,
+    deleted_changes,
+    update_task_stats,
+    updated_changes,
+)
+from src.tasks.utils import (
+    CURSOR_NEXT,
+    CURSOR_PREV,
+    decode_cursor,
+    decode_rank_cursor,
+    decode_sync_token,
+    encode_cursor,
+    encode_rank_cursor,
+    encode_sync_token,
+    etag_matches,
+    list_etag,
+    parse_task_etag,
+    rows_to_csv,
+    rows_to_ndjson,
+    task_etag,
+    to_naive_utc,
+)
+from src.auth.deps import (
+    get_stream_token_user,
+    get_token_user,
+    get_token_user_by_token,
+)
+from src.auth.models import User as DBUser
+from src.auth.schemas import TokenUser
 
 
 router = APIRouter(tags=['tasks'])
 
+TASK_COLUMNS = (
+    Task.id,
+    Task.text,
+    Task.created_at,
+    Task.updated_at,
+    Task.is_done,
+)
+TASK_COLUMN_KEYS = [task_column.key for task_column in TASK_COLUMNS]
+EXPORT_CHUNK_SIZE = 1000
+CACHE_CONTROL = 'private, no-cache'
+
+
+def task_source(include_archived: bool) -> FromClause:
+    '''
+    Таблица для списка задач: task_table или, вместе с архивом,
+    UNION ALL task_table и task_archive_table. Условия на внешний запрос
+    Postgres переносит в обе части, так что индексы используются.
+    '''
+    if not include_archived:
+        return Task.__table__
+    names = [*TASK_COLUMN_KEYS, 'author_id']
+    return union_all(*(
+        select(*(model.__table__.c[name] for name in names))
+        for model in (Task, TaskArchive)
+    )).subquery('tasks')
+
+
+async def bump_tasks_version(session: AsyncSession, user_id: int) -> int:
+    '''
+    Увеличивает версию задач пользователя в текущей транзакции.
+    Вызывается при каждом изменении задач, по версии строятся ETag списков.
+    '''
+    result = await session.execute(
+        update(DBUser)
+        .where(DBUser.id == user_id)
+        .values(tasks_version=DBUser.tasks_version + 1)
+        .returning(DBUser.tasks_version)
+    )
+    return result.scalar_one()
+
+
+async def delete_tasks(
+    session: AsyncSession, user_id: int, version: int, *criteria
+) -> list[int]:
+    '''
+    Удаляет задачи пользователя, оставляет на их месте отметки
+    для синхронизации и обновляет счетчики задач. Задачи удаляются одним
+    запросом WITH deleted AS (DELETE ... RETURNING), tombstones AS (INSERT)
+    SELECT, возвращаются id удаленных задач.
+    '''
+    deleted = (
+        delete(Task)
+        .where(Task.author_id == user_id, *criteria)
+        .returning(Task.id, Task.created_at, Task.is_done)
+        .cte('deleted')
+    )
+    tombstones = (
+        insert(TaskTombstone)
+        .from_select(
+            ['task_id', 'author_id', 'version', 'deleted_at'],
+            select(
+                deleted.c.id,
+                literal(user_id),
+                literal(version),
+                literal(datetime.datetime.utcnow()),
+            ),
+        )
+        .cte('tombstones')
+    )
+    result = await session.execute(
+        select(deleted).add_cte(deleted, tombstones))
+    rows = result.all()
+    await update_task_stats(session, user_id, deleted_changes(rows))
+    return [row.id for row in rows]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL},
+    )
+
+
+@dataclass
+class TaskPage:
+    '''Готовая страница списка задач: тело ответа и заголовки курсоров.'''
+
+    body: bytes
+    headers: dict[str, str]
+
+
+async def read_task_page(
+    session: AsyncSession,
+    user_id: int,
+    done: bool | None,
+    limit: int,
+    offset: int,
+    cursor: str | None,
+    include_archived: bool,
+    fields: tuple[str, ...],
+    text_max_len: int | None,
+) -> TaskPage:
+    '''
+    Выбирает страницу списка задач и сериализует ее в JSON.
+    Читаются только поля fields и created_at с id для курсоров,
+    текст обрезается до text_max_len символов еще в БД.
+    '''
+    tasks = task_source(include_archived)
+    keys = [key for key in TASK_COLUMN_KEYS if key in fields]
+    columns = {key: tasks.c[key] for key in keys}
+    if text_max_len is not None and 'text' in columns:
+        columns['text'] = func.substr(
+            tasks.c.text, 1, text_max_len).label('text')
+    for key in ('created_at', 'id'):
+        columns.setdefault(key, tasks.c[key])
+    query = (
+        select(*columns.values())
+        .where(tasks.c.author_id == user_id)
+    )
+    if done is not None:
+        query = query.where(tasks.c.is_done == done)
+    direction = CURSOR_NEXT
+    if cursor is not None:
+        created_at, task_id, direction = decode_cursor(cursor)
+        position = tuple_(tasks.c.created_at, tasks.c.id)
+        if direction == CURSOR_NEXT:
+            query = query.where(position > (created_at, task_id))
+        else:
+            query = query.where(position < (created_at, task_id))
+    else:
+        query = query.offset(offset)
+    if direction == CURSOR_NEXT:
+        query = query.order_by(tasks.c.created_at, tasks.c.id)
+    else:
+        query = query.order_by(tasks.c.created_at.desc(), tasks.c.id.desc())
+    # Берем на одну строку больше, чтобы знать, есть ли еще страница.
+    result = await session.execute(query.limit(limit + 1))
+    db_tasks = result.all()
+    has_more = len(db_tasks) > limit
+    db_tasks = db_tasks[:limit]
+    if direction == CURSOR_PREV:
+        db_tasks.reverse()
+    if not db_tasks:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Tasks not found")
+    first, last = db_tasks[0], db_tasks[-1]
+    if direction == CURSOR_PREV:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None or offset > 0
+    headers = {}
+    if has_next:
+        headers['X-Next-Cursor'] = encode_cursor(
+            last.created_at, last.id, CURSOR_NEXT)
+    if has_prev:
+        headers['X-Prev-Cursor'] = encode_cursor(
+            first.created_at, first.id, CURSOR_PREV)
+    if settings.FAST_JSON_RESPONSES:
+        body = rows_response(db_tasks, fields=keys).body
+    else:
+        body = list_json(schemas.Task, fields, db_tasks)
+    return TaskPage(body, headers)
+
 
 @router.get('/')
 async def get_task_list(
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
     done: bool = None,
-    limit: int = 100,
-    offset: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    include_archived: bool = False,
+    fields: str | None = None,
+    text_max_len: int | None = Query(None, ge=1),
+    if_none_match: str | None = Header(None),
 ) -> List[schemas.Task]:
     '''
     Позволяет получать список задач.
     Пользователи видят только свои задачи.
     Доступна пагинация через параметры limit и offset.
+    Доступна курсорная пагинация через параметр cursor: курсоры следующей
+    и предыдущей страниц возвращаются в заголовках X-Next-Cursor
+    и X-Prev-Cursor.
     Доступна фильтрация для выполненных задач через параметр done.
+    С include_archived=true в список попадают и задачи из архива.
+    Через fields=id,is_done можно получить только нужные поля,
+    а через text_max_len - обрезанный текст задач.
+    Поддерживает условные запросы через заголовок If-None-Match.
+    Одинаковые одновременные запросы пользователя выполняются один раз.
     '''
-    async with async_session_factory() as session:
-        if done is None:
-            query = (
-                select(Task)
-                .where(Task.author_id == user.id)
-                .order_by(Task.created_at)
-                .limit(limit)
-                .offset(offset)
-            )
-        else:
-            query = (
-                select(Task)
-                .filter(and_(Task.author_id == user.id, Task.is_done == done))
-                .order_by(Task.created_at)
-                .limit(limit)
-                .offset(offset)
-            )
-        result = await session.execute(query)
-        db_tasks = result.scalars().all()
-        if not db_tasks:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Tasks not found")
-        return db_tasks
+    names = parse_fields(fields, schemas.Task)
+    if cursor is not None:
+        # с курсором offset не используется
+        offset = 0
+    params = (
+        done, limit, offset, cursor, include_archived, names, text_max_len)
+    session = uow.reader(user.id)
+    version = (await session.execute(
+        select(DBUser.tasks_version).where(DBUser.id == user.id)
+    )).scalar_one()
+    etag = list_etag(version, *params)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    async def load() -> TaskPage:
+        return await read_task_page(session, user.id, *params)
+
+    if settings.TASK_LIST_SINGLE_FLIGHT:
+        # версия в ключе: страница не переживет изменения задач,
+        # в том числе сделанного в другом воркере
+        page = await task_lists.run(user.id, (version, *params), load)
+    else:
+        page = await load()
+    return Response(
+        page.body,
+        media_type='application/json',
+        headers={
+            **page.headers,
+            'ETag': etag,
+            'Cache-Control': CACHE_CONTROL,
+        },
+    )
 
 
 @router.post('/')
 async def create_task(
     text: schemas.TaskCreate,
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> schemas.Task:
     '''Позволяет создавать задачу.'''
-    async with async_session_factory() as session:
-        db_task = Task(text=text.text, author=user)
-        session.add(db_task)
+    now = datetime.datetime.utcnow()
+    session = uow.session
+    version = await bump_tasks_version(session, user.id)
+    query = (
+        insert(Task)
+        .values(
+            text=text.text,
+            author_id=user.id,
+            created_at=now,
+            updated_at=now,
+            version=version,
+        )
+        .returning(*TASK_COLUMNS)
+    )
+    result = await session.execute(query)
+    row = result.one()
+    await update_task_stats(session, user.id, created_changes([row]))
+    db_task = schemas.Task.model_validate(row._asdict())
+    await publish_task_events(
+        session, user.id, [task_event('created', db_task.id, db_task)])
+    await session.commit()
+    mark_write(user.id)
+    task_lists.invalidate(user.id)
+    return db_task
+
+
+@router.post('/bulk/')
+async def create_task_bulk(
+    data: schemas.TaskBulkCreate,
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> List[schemas.Task]:
+    '''
+    Позволяет создать несколько задач одним запросом.
+    Все задачи добавляются одним INSERT ... RETURNING.
+    '''
+    session = uow.session
+    now = datetime.datetime.utcnow()
+    version = await bump_tasks_version(session, user.id)
+    result = await session.execute(
+        insert(Task).returning(
+            *TASK_COLUMNS, sort_by_parameter_order=True),
+        [
+            {
+                'text': task.text,
+                'author_id': user.id,
+                'created_at': now,
+                'updated_at': now,
+                'version': version,
+            }
+            for task in data.tasks
+        ],
+    )
+    rows = result.all()
+    await update_task_stats(session, user.id, created_changes(rows))
+    db_tasks = [schemas.Task.model_validate(row._asdict()) for row in rows]
+    await publish_task_events(session, user.id, [
+        task_event('created', task.id, task) for task in db_tasks
+    ])
+    await session.commit()
+    mark_write(user.id)
+    task_lists.invalidate(user.id)
+    return db_tasks
+
+
+@router.patch('/bulk/')
+async def update_task_bulk(
+    data: schemas.TaskBulkUpdate,
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> List[schemas.TaskBulkResult]:
+    '''
+    Позволяет изменить несколько задач одним запросом.
+    Все изменения применяются одним UPDATE ... FROM (VALUES ...) RETURNING,
+    для каждой задачи возвращается свой статус.
+    '''
+    # при повторах id побеждает последнее изменение
+    changes = {task.id: task for task in data.tasks}
+    rows = values(
+        column('id', Integer),
+        column('text', String),
+        column('is_done', Boolean),
+        name='changes',
+    ).data([
+        (task_id, task.text, task.is_done)
+        for task_id, task in changes.items()
+    ])
+    # прежнее is_done нужно для счетчиков, UPDATE ... FROM его видит
+    previous = Task.__table__.alias('previous')
+    session = uow.session
+    version = await bump_tasks_version(session, user.id)
+    query = (
+        update(Task)
+        .where(
+            Task.id == rows.c.id,
+            Task.author_id == user.id,
+            previous.c.id == Task.id,
+            previous.c.author_id == Task.author_id,
+        )
+        .values(
+            # NULL в VALUES не типизирован, поэтому приводим явно
+            text=func.coalesce(cast(rows.c.text, String), Task.text),
+            is_done=func.coalesce(
+                cast(rows.c.is_done, Boolean), Task.is_done),
+            updated_at=datetime.datetime.utcnow(),
+            version=version,
+        )
+        .returning(
+            *TASK_COLUMNS, previous.c.is_done.label('was_done'))
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(query)
+    updated_rows = result.all()
+    updated = {
+        row.id: schemas.Task.model_validate(row._asdict())
+        for row in updated_rows
+    }
+    if not updated:
+        await session.rollback()
+        return [
+            schemas.TaskBulkResult(
+                id=task_id, status=status.HTTP_404_NOT_FOUND)
+            for task_id in changes
+        ]
+    await update_task_stats(
+        session, user.id, updated_changes(updated_rows))
+    await publish_task_events(session, user.id, [
+        task_event('updated', task.id, task) for task in updated.values()
+    ])
+    await session.commit()
+    mark_write(user.id)
+    task_lists.invalidate(user.id)
+    return [
+        schemas.TaskBulkResult(
+            id=task_id,
+            status=status.HTTP_200_OK,
+            task=updated[task_id],
+        )
+        if task_id in updated
+        else schemas.TaskBulkResult(
+            id=task_id, status=status.HTTP_404_NOT_FOUND)
+        for task_id in changes
+    ]
+
+
+@router.delete('/bulk/')
+async def delete_task_bulk(
+    data: schemas.TaskBulkDelete,
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+) -> List[schemas.TaskBulkResult]:
+    '''
+    Позволяет удалить несколько задач одним запросом.
+    Все задачи удаляются одним запросом с DELETE ... RETURNING,
+    для каждой задачи возвращается свой статус.
+    '''
+    session = uow.session
+    version = await bump_tasks_version(session, user.id)
+    deleted = set(await delete_tasks(
+        session, user.id, version, Task.id.in_(data.ids)))
+    if deleted:
+        await publish_task_events(session, user.id, [
+            task_event('deleted', task_id) for task_id in deleted
+        ])
         await session.commit()
-        await session.refresh(db_task)
-        return db_task
+        mark_write(user.id)
+        task_lists.invalidate(user.id)
+    else:
+        # ничего не удалено: версия не должна меняться
+        await session.rollback()
+    return [
+        schemas.TaskBulkResult(
+            id=task_id,
+            status=(
+                status.HTTP_204_NO_CONTENT if task_id in deleted
+                else status.HTTP_404_NOT_FOUND
+            ),
+        )
+        for task_id in dict.fromkeys(data.ids)
+    ]
+
+
+@router.get('/export/')
+async def export_tasks(
+    user: TokenUser = Depends(get_stream_token_user),
+    export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format'),
+    done: bool = None,
+    created_from: datetime.datetime | None = None,
+    created_to: datetime.datetime | None = None,
+) -> StreamingResponse:
+    '''
+    Позволяет выгрузить все задачи пользователя в NDJSON или CSV.
+    Задачи читаются серверным курсором и отдаются частями,
+    поэтому расход памяти не зависит от числа задач.
+    Доступна фильтрация через параметры done, created_from и created_to.
+    Первая порция читается до начала ответа, поэтому ошибка запроса
+    возвращается статусом, а не обрывом выгрузки.
+    '''
+    created_from = to_naive_utc(created_from)
+    created_to = to_naive_utc(created_to)
+    query = select(*TASK_COLUMNS).where(Task.author_id == user.id)
+    if done is not None:
+        query = query.where(Task.is_done == done)
+    if created_from is not None:
+        query = query.where(Task.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Task.created_at < created_to)
+    query = query.order_by(Task.created_at, Task.id).execution_options(
+        yield_per=EXPORT_CHUNK_SIZE)
+    encode = rows_to_csv if export_format == 'csv' else rows_to_ndjson
+
+    session = read_session(user.id)
+    try:
+        result = await session.stream(query)
+        partitions = result.partitions()
+        first = await anext(partitions, None)
+    except BaseException:
+        await session.close()
+        raise
+
+    async def stream_rows():
+        try:
+            if export_format == 'csv':
+                yield rows_to_csv((), header=result.keys())
+            if first is not None:
+                yield encode(first)
+            async for rows in partitions:
+                yield encode(rows)
+        finally:
+            await session.close()
+
+    media_type = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }[export_format]
+    # повторное закрытие безвредно: фоновая задача нужна, если клиент
+    # отключился до начала потока и stream_rows не запускался
+    return StreamingResponse(
+        stream_rows(),
+        media_type=media_type,
+        headers={
+            'Content-Disposition':
+                f'attachment; filename="tasks.{export_format}"',
+        },
+        background=BackgroundTask(session.close),
+    )
+
+
+@router.get('/search/')
+async def search_tasks(
+    response: Response,
+    q: str = Query(min_length=1, max_length=200),
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+) -> List[schemas.Task]:
+    '''
+    Позволяет искать задачи по тексту.
+    Ищет как по словам (полнотекстовый поиск), так и по подстроке,
+    результаты отсортированы по релевантности.
+    Доступна курсорная пагинация через параметр cursor: курсор следующей
+    страницы возвращается в заголовке X-Next-Cursor.
+    '''
+    tsquery = func.websearch_to_tsquery(
+        literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+    rank = func.ts_rank_cd(Task.search_vector, tsquery)
+    query = select(*TASK_COLUMNS, rank.label('rank')).where(
+        Task.author_id == user.id,
+        or_(
+            Task.search_vector.bool_op('@@')(tsquery),
+            Task.text.icontains(q, autoescape=True),
+        ),
+    )
+    if cursor is not None:
+        last_rank, last_id = decode_rank_cursor(cursor)
+        query = query.where(tuple_(rank, Task.id) < (last_rank, last_id))
+    query = query.order_by(rank.desc(), Task.id.desc()).limit(limit + 1)
+    session = uow.reader(user.id)
+    result = await session.execute(query)
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers['X-Next-Cursor'] = encode_rank_cursor(
+            rows[-1].rank, rows[-1].id)
+    return [schemas.Task.model_validate(row._asdict()) for row in rows]
+
+
+@router.get('/changes/')
+async def get_task_changes(
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    since: str | None = None,
+    limit: int = Query(500, ge=1, le=5000),
+) -> schemas.TaskChanges:
+    '''
+    Позволяет получить изменения задач с момента прошлой синхронизации.
+    Возвращает измененные и созданные задачи, id удаленных задач
+    и токен next_token, который нужно передать в since в следующий раз.
+    Без since возвращаются все задачи пользователя (полная синхронизация),
+    без удаленных.
+    Если has_more, изменения получены не полностью и нужно
+    сразу запросить следующую порцию.
+    Если since старше срока хранения отметок об удалении
+    (TASK_TOMBSTONE_RETENTION_DAYS), возвращается 410 и нужна
+    полная синхронизация.
+    '''
+    session = uow.reader(user.id)
+    if since is None:
+        version, task_id = -1, 0
+        # позиция, с которой продолжится синхронизация после полной
+        start = (await session.execute(
+            select(DBUser.tasks_version).where(DBUser.id == user.id)
+        )).scalar_one()
+    else:
+        version, task_id, start = decode_sync_token(since)
+    live = select(
+        Task.id, Task.text, Task.created_at, Task.updated_at, Task.is_done,
+        Task.version, literal(False).label('deleted'),
+    ).where(
+        Task.author_id == user.id,
+        tuple_(Task.version, Task.id) > (version, task_id),
+    )
+    if start is None:
+        dead = select(
+            TaskTombstone.task_id, null(), null(), null(), null(),
+            TaskTombstone.version, literal(True),
+        ).where(
+            TaskTombstone.author_id == user.id,
+            tuple_(TaskTombstone.version, TaskTombstone.task_id)
+            > (version, task_id),
+        )
+        changes = union_all(live, dead).subquery('changes')
+    else:
+        changes = live.subquery('changes')
+    query = (
+        select(changes)
+        .order_by(changes.c.version, changes.c.id)
+        .limit(limit + 1)
+    )
+    result = await session.execute(query)
+    rows = result.all()
+    if start is None:
+        # читается после изменений: если отметки удалили раньше,
+        # это будет видно здесь
+        pruned_version = (await session.execute(
+            select(DBUser.tombstones_pruned_version)
+            .where(DBUser.id == user.id)
+        )).scalar_one()
+        if version < pruned_version:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Full resync required",
+            )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        version, task_id = rows[-1].version, rows[-1].id
+    if start is not None and not has_more:
+        # удаления во время полной синхронизации придут со следующими
+        # изменениями, повторно присланные задачи безвредны
+        next_token = encode_sync_token(start, 0)
+    else:
+        next_token = encode_sync_token(version, task_id, start)
+    return schemas.TaskChanges(
+        changed=[
+            schemas.Task.model_validate(row._asdict())
+            for row in rows if not row.deleted
+        ],
+        deleted=[row.id for row in rows if row.deleted],
+        next_token=next_token,
+        has_more=has_more,
+    )
+
+
+@router.websocket('/stream/')
+async def stream_task_events(
+    websocket: WebSocket,
+    token: str | None = None,
+) -> None:
+    '''
+    Позволяет получать события изменения задач по WebSocket.
+    Access токен передается в заголовке Authorization
+    или в параметре token. Если клиент не успевает читать события,
+    соединение закрывается с кодом 1013, после чего нужно
+    досинхронизироваться через /tasks/changes/ и переподключиться.
+    Событие resync означает, что часть событий могла потеряться
+    и нужно досинхронизироваться, не переподключаясь.
+    '''
+    if token is None:
+        scheme, _, token = websocket.headers.get(
+            'authorization', '').partition(' ')
+        if scheme.lower() != 'bearer':
+            token = None
+    try:
+        if token is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        user = await get_token_user_by_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = await subscribe(user.id)
+
+    async def send_events():
+        while True:
+            task_event = await subscription.get()
+            if task_event is None:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
+            await websocket.send_json(task_event)
+
+    async def wait_disconnect():
+        # входящие сообщения не нужны, но без чтения не узнать об отключении
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+
+    tasks = {
+        asyncio.create_task(send_events()),
+        asyncio.create_task(wait_disconnect()),
+    }
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        subscription.close()
+
+
+@router.get('/events/')
+async def stream_task_events_sse(
+    user: TokenUser = Depends(get_stream_token_user),
+) -> StreamingResponse:
+    '''
+    Позволяет получать события изменения задач через Server-Sent Events,
+    если WebSocket недоступен. При переполнении очереди приходит событие
+    overflow и поток завершается. Событие resync, как и в WebSocket,
+    требует досинхронизации через /tasks/changes/.
+    '''
+    subscription = await subscribe(user.id)
+
+    async def stream_events():
+        try:
+            while True:
+                try:
+                    task_event = await subscription.get(
+                        timeout=settings.TASK_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if task_event is None:
+                    yield 'event: overflow\ndata: {}\n\n'
+                    return
+                yield (
+                    f'event: {task_event["type"]}\n'
+                    f'data: {json.dumps(task_event)}\n\n'
+                )
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream_events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@router.get('/stats/')
+async def get_task_stats(
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    days: int = Query(30, ge=1, le=366),
+) -> schemas.TaskStats:
+    '''
+    Позволяет получить число задач пользователя: всего, сделанных
+    и открытых, а также число задач по дням создания за последние days дней.
+    Читает заранее посчитанные счетчики, а не сами задачи.
+    '''
+    today = datetime.datetime.utcnow().date()
+    since = today - datetime.timedelta(days=days - 1)
+    session = uow.reader(user.id)
+    totals = (await session.execute(
+        select(UserTaskStats.total, UserTaskStats.done)
+        .where(UserTaskStats.user_id == user.id)
+    )).one_or_none()
+    result = await session.execute(
+        select(
+            UserTaskDailyStats.day,
+            UserTaskDailyStats.created,
+            UserTaskDailyStats.done,
+        )
+        .where(
+            UserTaskDailyStats.user_id == user.id,
+            UserTaskDailyStats.day >= since,
+        )
+    )
+    daily = {row.day: row for row in result}
+    total, done = totals if totals is not None else (0, 0)
+    return schemas.TaskStats(
+        total=total,
+        done=done,
+        open=total - done,
+        daily=[
+            schemas.TaskDailyStats(
+                day=day,
+                created=daily[day].created if day in daily else 0,
+                done=daily[day].done if day in daily else 0,
+            )
+            for day in (
+                since + datetime.timedelta(days=number)
+                for number in range(days)
+            )
+        ],
+    )
 
 
 @router.get('/{task_id}/')
 async def get_task(
     task_id: int,
-    user: User = Depends(get_current_user),
+    response: Response,
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    if_none_match: str | None = Header(None),
 ) -> schemas.Task:
-    '''Позволяет получить конкретную задачу по ее id.'''
-    async with async_session_factory() as session:
-        query = select(Task).filter(
-            and_(Task.id == task_id, Task.author_id == user.id))
-        result = await session.execute(query)
-        db_task = result.scalars().first()
-        if not db_task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        return db_task
+    '''
+    Позволяет получить конкретную задачу по ее id.
+    Поддерживает условные запросы через заголовок If-None-Match.
+    '''
+    condition = and_(Task.id == task_id, Task.author_id == user.id)
+    session = uow.reader(user.id)
+    if if_none_match is not None:
+        # проверяем ETag по времени изменения, не загружая всю задачу
+        updated_at = (await session.execute(
+            select(Task.updated_at).filter(condition)
+        )).scalar_one_or_none()
+        if updated_at is not None:
+            etag = task_etag(task_id, updated_at)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+    query = select(Task).filter(condition)
+    result = await session.execute(query)
+    db_task = result.scalars().first()
+    if not db_task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    response.headers['ETag'] = task_etag(db_task.id, db_task.updated_at)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return db_task
 
 
 @router.patch('/{task_id}/')
 async def update_task(
     task_id: int,
     task: schemas.TaskUpdate,
-    user: User = Depends(get_current_user),
+    response: Response,
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+    if_match: str | None = Header(None),
 ) -> schemas.Task:
-    '''Позволяет изменить конкретную задачу по ее id.'''
-    async with async_session_factory() as session:
-        query = select(Task).filter(
-            and_(Task.id == task_id, Task.author_id == user.id))
-        result = await session.execute(query)
-        db_task = result.scalars().first()
-        if not db_task:
+    '''
+    Позволяет изменить конкретную задачу по ее id.
+    С заголовком If-Match задача изменяется, только если она не менялась
+    с момента получения этого ETag, иначе возвращается 412.
+    '''
+    condition = and_(Task.id == task_id, Task.author_id == user.id)
+    query_condition = condition
+    if if_match is not None and if_match.strip() != '*':
+        expected = parse_task_etag(if_match)
+        if expected is None or expected[0] != task_id:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        task_data = task.model_dump(exclude_unset=True)
-        task_data['updated_at'] = datetime.datetime.utcnow()
-        for key, val in task_data.items():
-            setattr(db_task, key, val)
-        session.add(db_task)
-        await session.commit()
-        await session.refresh(db_task)
-        return db_task
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Task has been modified")
+        query_condition = and_(condition, Task.updated_at == expected[1])
+    task_data = task.model_dump(exclude_unset=True)
+    task_data['updated_at'] = datetime.datetime.utcnow()
+    # прежнее is_done нужно для счетчиков, UPDATE ... FROM его видит
+    previous = Task.__table__.alias('previous')
+    session = uow.session
+    task_data['version'] = await bump_tasks_version(session, user.id)
+    query = (
+        update(Task)
+        .where(
+            query_condition,
+            previous.c.id == Task.id,
+            previous.c.author_id == Task.author_id,
+        )
+        .values(**task_data)
+        .returning(
+            *TASK_COLUMNS, previous.c.is_done.label('was_done'))
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(query)
+    row = result.one_or_none()
+    if row is None:
+        if query_condition is not condition:
+            exists = (await session.execute(
+                select(Task.id).filter(condition)
+            )).scalar_one_or_none()
+            if exists is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_412_PRECONDITION_FAILED,
+                    detail="Task has been modified")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    await update_task_stats(session, user.id, updated_changes([row]))
+    db_task = schemas.Task.model_validate(row._asdict())
+    await publish_task_events(
+        session, user.id, [task_event('updated', db_task.id, db_task)])
+    await session.commit()
+    mark_write(user.id)
+    task_lists.invalidate(user.id)
+    response.headers['ETag'] = task_etag(db_task.id, db_task.updated_at)
+    return db_task
 
 
 @router.delete('/{task_id}/')
 async def delete_task(
     task_id: int,
-    user: User = Depends(get_current_user),
+    user: TokenUser = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
 ) -> Response:
     '''Позволяет удалить конкретную задачу по ее id.'''
-    async with async_session_factory() as session:
-        query = select(Task).filter(
-            and_(Task.id == task_id, Task.author_id == user.id))
-        result = await session.execute(query)
-        db_task = result.scalars().first()
-        if not db_task:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        await session.delete(db_task)
-        await session.commit()
-        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    session = uow.session
+    version = await bump_tasks_version(session, user.id)
+    if not await delete_tasks(session, user.id, version, Task.id == task_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    await publish_task_events(
+        session, user.id, [task_event('deleted', task_id)])
+    await session.commit()
+    mark_write(user.id)
+    task_lists.invalidate(user.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
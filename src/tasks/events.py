@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+
+import asyncpg
+from pydantic import BaseModel
+from sqlalchemy import Text, event, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.auth.cache import user_cache
+from src.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PG_CHANNEL = 'task_events'
+# логины измененных пользователей, чтобы сбросить их в кешах воркеров
+PG_USER_CHANNEL = 'user_changes'
+# лимит полезной нагрузки NOTIFY в Postgres - 8000 байт
+PG_PAYLOAD_LIMIT = 7900
+# пауза перед повторным подключением LISTEN, секунды
+PG_RECONNECT_DELAY = 0.5
+PG_RECONNECT_MAX_DELAY = 30
+_PENDING_KEY = 'task_events'
+
+
+class Subscription:
+    '''
+    Подписка на события задач одного пользователя.
+    Если подписчик не успевает разбирать очередь, подписка сбрасывается:
+    клиент должен переподключиться и досинхронизироваться
+    через /tasks/changes/.
+    '''
+
+    def __init__(self, hub: 'TaskEventHub', user_id: int) -> None:
+        self.hub = hub
+        self.user_id = user_id
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(
+            maxsize=settings.TASK_STREAM_QUEUE_SIZE)
+        self.dropped = False
+
+    def push(self, task_event: dict) -> None:
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(task_event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.hub.dropped += 1
+            # освобождаем место под маркер конца потока
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        '''
+        Ждет следующее событие.
+        Возвращает None, если подписка сброшена из-за переполнения,
+        и бросает TimeoutError, если за timeout событий не было.
+        '''
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class TaskEventHub:
+    '''Раздает события задач подписчикам внутри процесса.'''
+
+    def __init__(self) -> None:
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self.published = 0
+        self.dropped = 0
+        self.resyncs = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(self, user_id)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def dispatch(self, user_id: int, events: list[dict]) -> None:
+        for subscription in list(self._subscribers.get(user_id, ())):
+            for task_event in events:
+                subscription.push(task_event)
+        self.published += len(events)
+
+    def resync(self) -> None:
+        '''
+        Сообщает всем подписчикам, что часть событий могла потеряться
+        и нужно досинхронизироваться через /tasks/changes/.
+        '''
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.push({'type': 'resync'})
+        self.resyncs += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'subscribers': sum(map(len, self._subscribers.values())),
+            'published': self.published,
+            'dropped': self.dropped,
+            'resyncs': self.resyncs,
+        }
+
+
+class MemoryBackend:
+    '''События раздаются только подписчикам текущего процесса.'''
+
+    def __init__(self, hub: TaskEventHub) -> None:
+        self.hub = hub
+
+    async def publish(
+        self, session: AsyncSession, user_id: int, events: list[dict]
+    ) -> None:
+        # события раздаются после коммита, см. _dispatch_after_commit
+        pending = session.sync_session.info.setdefault(_PENDING_KEY, [])
+        pending.append((user_id, events))
+
+    async def publish_user_changed(
+        self, session: AsyncSession, login: str
+    ) -> None:
+        # кеш текущего воркера обновляет сам обработчик
+        pass
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class PostgresBackend(MemoryBackend):
+    '''
+    События рассылаются через LISTEN/NOTIFY, поэтому доходят
+    до подписчиков во всех воркерах. NOTIFY отправляется в транзакции
+    изменения и доставляется только после ее коммита.
+    Через тот же канал воркеры сбрасывают в кеше измененных пользователей.
+    Если соединение LISTEN оборвалось, оно переподключается с растущей
+    паузой, а подписчики получают событие resync: уведомления,
+    отправленные без соединения, до них уже не дойдут.
+    '''
+
+    def __init__(self, hub: TaskEventHub) -> None:
+        super().__init__(hub)
+        self._connection: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def publish(
+        self, session: AsyncSession, user_id: int, events: list[dict]
+    ) -> None:
+        payloads = []
+        for task_event in events:
+            payload = json.dumps({'user_id': user_id, 'event': task_event})
+            if len(payload.encode()) > PG_PAYLOAD_LIMIT:
+                # слишком большое событие отправляем без тела задачи
+                payload = json.dumps({
+                    'user_id': user_id,
+                    'event': {
+                        'type': task_event['type'],
+                        'id': task_event['id'],
+                    },
+                })
+            payloads.append(payload)
+        payload_column = func.unnest(
+            literal(payloads, ARRAY(Text))).column_valued('payload')
+        await session.execute(
+            select(func.pg_notify(PG_CHANNEL, payload_column)))
+
+    async def publish_user_changed(
+        self, session: AsyncSession, login: str
+    ) -> None:
+        payload = json.dumps({'login': login, 'pid': os.getpid()})
+        await session.execute(
+            select(func.pg_notify(PG_USER_CHANNEL, payload)))
+
+    async def start(self) -> None:
+        async with self._lock:
+            if (
+                self._connection is not None
+                or self._reconnect_task is not None
+            ):
+                return
+            self._connection = await self._connect()
+
+    async def stop(self) -> None:
+        async with self._lock:
+            if self._reconnect_task is not None:
+                self._reconnect_task.cancel()
+                self._reconnect_task = None
+            connection, self._connection = self._connection, None
+            if connection is not None:
+                await connection.close()
+
+    async def _connect(self) -> asyncpg.Connection:
+        connection = await asyncpg.connect(
+            host=settings.DB_HOST,
+            port=settings.DB_PORT,
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            database=settings.POSTGRES_DB,
+        )
+        await connection.add_listener(PG_CHANNEL, self._on_notify)
+        await connection.add_listener(PG_USER_CHANNEL, self._on_user_notify)
+        connection.add_termination_listener(self._on_terminate)
+        return connection
+
+    def _on_terminate(self, connection: asyncpg.Connection) -> None:
+        # при stop соединение уже отвязано и переподключаться не нужно
+        if connection is not self._connection:
+            return
+        logger.warning('Task events LISTEN connection lost, reconnecting')
+        self._connection = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = PG_RECONNECT_DELAY
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                connection = await self._connect()
+            except (OSError, asyncpg.PostgresError) as exc:
+                delay = min(delay * 2, PG_RECONNECT_MAX_DELAY)
+                logger.warning(
+                    'Task events reconnect failed: %s. Retrying in %.1f s',
+                    exc, delay,
+                )
+                continue
+            try:
+                async with self._lock:
+                    self._reconnect_task = None
+                    self._connection = connection
+            except asyncio.CancelledError:
+                # stop() во время подключения
+                await connection.close()
+                raise
+            # изменения пользователей за время без соединения неизвестны
+            user_cache.clear()
+            self.hub.resync()
+            return
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            self.hub.dispatch(data['user_id'], [data['event']])
+        except (ValueError, KeyError):
+            logger.warning('Malformed task event payload: %s', payload)
+
+    def _on_user_notify(
+        self, connection, pid, channel, payload: str
+    ) -> None:
+        try:
+            data = json.loads(payload)
+            if data['pid'] != os.getpid():
+                user_cache.invalidate(data['login'])
+        except (ValueError, KeyError):
+            logger.warning('Malformed user change payload: %s', payload)
+
+
+task_hub = TaskEventHub()
+task_events_backend = {
+    'memory': MemoryBackend,
+    'postgres': PostgresBackend,
+}[settings.TASK_EVENTS_BACKEND](task_hub)
+
+
+def task_event(
+    event_type: str, task_id: int, task: BaseModel | None = None
+) -> dict:
+    '''Позволяет собрать событие задачи: created, updated или deleted.'''
+    data = {'type': event_type, 'id': task_id}
+    if task is not None:
+        data['task'] = task.model_dump(mode='json')
+    return data
+
+
+async def publish_task_events(
+    session: AsyncSession, user_id: int, events: list[dict]
+) -> None:
+    '''
+    Позволяет опубликовать события задач пользователя.
+    Вызывается до коммита: подписчики получат события,
+    только если транзакция завершится успешно.
+    '''
+    await task_events_backend.publish(session, user_id, events)
+
+
+async def publish_user_changed(session: AsyncSession, login: str) -> None:
+    '''
+    Позволяет сбросить пользователя в кешах других воркеров
+    (с TASK_EVENTS_BACKEND=postgres). Вызывается до коммита изменения.
+    '''
+    await task_events_backend.publish_user_changed(session, login)
+
+
+async def subscribe(user_id: int) -> Subscription:
+    '''Позволяет подписаться на события задач пользователя.'''
+    await task_events_backend.start()
+    return task_hub.subscribe(user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_after_commit(session: Session) -> None:
+    for user_id, events in session.info.pop(_PENDING_KEY, ()):
+        task_hub.dispatch(user_id, events)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -1,21 +1,139 @@
 import datetime
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import BigInteger, Computed, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.db import Base
 
 
+SEARCH_CONFIG = 'simple'
+
+
 class Task(Base):
     __tablename__ = 'task_table'
+    __table_args__ = (
+        Index(
+            'ix_task_table_author_id_created_at_id',
+            'author_id', 'created_at', 'id',
+        ),
+        Index(
+            'ix_task_table_author_id_created_at_id_done',
+            'author_id', 'created_at', 'id',
+            postgresql_where=text('is_done'),
+        ),
+        Index(
+            'ix_task_table_author_id_created_at_id_open',
+            'author_id', 'created_at', 'id',
+            postgresql_where=text('NOT is_done'),
+        ),
+        Index(
+            'ix_task_table_author_id_version_id',
+            'author_id', 'version', 'id',
+        ),
+        Index(
+            'ix_task_table_search_vector',
+            'search_vector',
+            postgresql_using='gin',
+        ),
+        Index(
+            'ix_task_table_text_trgm',
+            'text',
+            postgresql_using='gin',
+            postgresql_ops={'text': 'gin_trgm_ops'},
+        ),
+        # все запросы к задачам ограничены автором, поэтому каждый
+        # из них читает одну секцию; секции создаются миграцией
+        {'postgresql_partition_by': 'HASH (author_id)'},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    # в первичный ключ секционированной таблицы входит ключ секционирования
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     text: Mapped[str]
     created_at: Mapped[datetime.datetime] = mapped_column(
         default=datetime.datetime.utcnow)
     updated_at: Mapped[datetime.datetime] = mapped_column(
         default=datetime.datetime.utcnow)
     is_done: Mapped[bool] = mapped_column(default=False)
+    # версия задач пользователя (User.tasks_version) на момент изменения
+    version: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default='0')
+    # вычисляется самой БД, в обычных выборках не загружается
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', text)", persisted=True),
+        deferred=True,
+    )
 
-    author_id: Mapped[int] = mapped_column(ForeignKey('user_table.id'))
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey('user_table.id'), primary_key=True)
     author: Mapped['User'] = relationship("User", back_populates="task")
+
+
+class TaskArchive(Base):
+    '''
+    Старая выполненная задача, перенесенная из task_table
+    командой python -m src.tasks.archive. Доступна только для чтения.
+    '''
+
+    __tablename__ = 'task_archive_table'
+    __table_args__ = (
+        Index(
+            'ix_task_archive_table_author_id_created_at_id',
+            'author_id', 'created_at', 'id',
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    text: Mapped[str]
+    created_at: Mapped[datetime.datetime]
+    updated_at: Mapped[datetime.datetime]
+    is_done: Mapped[bool]
+    version: Mapped[int] = mapped_column(BigInteger)
+    author_id: Mapped[int] = mapped_column(ForeignKey('user_table.id'))
+    archived_at: Mapped[datetime.datetime] = mapped_column(
+        default=datetime.datetime.utcnow)
+
+
+class TaskTombstone(Base):
+    '''Отметка об удаленной задаче для инкрементальной синхронизации.'''
+
+    __tablename__ = 'task_tombstone_table'
+    __table_args__ = (
+        Index(
+            'ix_task_tombstone_table_author_id_version_task_id',
+            'author_id', 'version', 'task_id',
+        ),
+    )
+
+    task_id: Mapped[int] = mapped_column(primary_key=True)
+    author_id: Mapped[int] = mapped_column(ForeignKey('user_table.id'))
+    version: Mapped[int] = mapped_column(BigInteger)
+    deleted_at: Mapped[datetime.datetime] = mapped_column(
+        default=datetime.datetime.utcnow)
+
+
+class UserTaskStats(Base):
+    '''Счетчики задач пользователя, обновляются вместе с задачами.'''
+
+    __tablename__ = 'user_task_stats'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('user_table.id'), primary_key=True)
+    total: Mapped[int] = mapped_column(default=0, server_default='0')
+    done: Mapped[int] = mapped_column(default=0, server_default='0')
+
+
+class UserTaskDailyStats(Base):
+    '''
+    Счетчики задач пользователя по дням создания (UTC):
+    сколько задач, созданных в этот день, существует и сколько из них сделано.
+    '''
+
+    __tablename__ = 'user_task_daily_stats'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('user_table.id'), primary_key=True)
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    created: Mapped[int] = mapped_column(default=0, server_default='0')
+    done: Mapped[int] = mapped_column(default=0, server_default='0')
@@ -1,7 +1,10 @@
 import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
+
+
+BULK_MAX_ITEMS = 1000
 
 
 class TaskBase(BaseModel):
@@ -18,10 +21,52 @@ class Task(TaskBase):
     updated_at: datetime.datetime
     is_done: bool
 
-    class Config:
-        orm_model = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TaskUpdate(BaseModel):
     text: Optional[str] = None
     is_done: Optional[bool] = None
+
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: int
+
+
+class TaskBulkUpdate(BaseModel):
+    tasks: List[TaskBulkUpdateItem] = Field(
+        min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkResult(BaseModel):
+    id: int
+    status: int
+    task: Optional[Task] = None
+
+
+class TaskChanges(BaseModel):
+    changed: List[Task]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
+
+
+class TaskDailyStats(BaseModel):
+    day: datetime.date
+    created: int
+    done: int
+
+
+class TaskStats(BaseModel):
+    total: int
+    done: int
+    open: int
+    daily: List[TaskDailyStats]
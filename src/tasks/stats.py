@@ -0,0 +1,186 @@
+'''
+Счетчики задач пользователей для /tasks/stats/.
+
+Счетчики обновляются в транзакции изменения задач через update_task_stats.
+Пересчитать их с нуля (например, после миграции) можно командой
+
+    python -m src.tasks.stats rebuild [--user-id ID] [--batch-size N]
+'''
+import argparse
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Iterable, Sequence
+
+from sqlalchemy import Date, cast, delete, func, insert, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import (
+    Task,
+    TaskArchive,
+    UserTaskDailyStats,
+    UserTaskStats,
+)
+
+
+REBUILD_BATCH_SIZE = 1000
+
+# (created_at задачи, изменение числа задач, изменение числа сделанных)
+StatsChange = tuple[datetime.datetime, int, int]
+
+
+def created_changes(rows: Iterable) -> list[StatsChange]:
+    '''Изменения счетчиков для созданных задач.'''
+    return [(row.created_at, 1, int(row.is_done)) for row in rows]
+
+
+def deleted_changes(rows: Iterable) -> list[StatsChange]:
+    '''Изменения счетчиков для удаленных задач.'''
+    return [(row.created_at, -1, -int(row.is_done)) for row in rows]
+
+
+def updated_changes(rows: Iterable) -> list[StatsChange]:
+    '''
+    Изменения счетчиков для измененных задач.
+    Строки должны содержать прежнее значение is_done в was_done.
+    '''
+    return [
+        (row.created_at, 0, int(row.is_done) - int(row.was_done))
+        for row in rows if row.is_done != row.was_done
+    ]
+
+
+async def update_task_stats(
+    session: AsyncSession, user_id: int, changes: Iterable[StatsChange]
+) -> None:
+    '''
+    Применяет изменения к счетчикам задач пользователя в текущей транзакции.
+    Вызывается после bump_tasks_version, который блокирует строку
+    пользователя, поэтому изменения одного пользователя не пересекаются.
+    '''
+    daily = defaultdict(lambda: [0, 0])
+    for created_at, created, done in changes:
+        counters = daily[created_at.date()]
+        counters[0] += created
+        counters[1] += done
+    daily = {day: counters for day, counters in daily.items() if any(counters)}
+    if not daily:
+        return
+    total = sum(created for created, _ in daily.values())
+    done = sum(done for _, done in daily.values())
+
+    query = pg_insert(UserTaskStats).values(
+        user_id=user_id, total=total, done=done)
+    await session.execute(query.on_conflict_do_update(
+        index_elements=[UserTaskStats.user_id],
+        set_={
+            'total': UserTaskStats.total + query.excluded.total,
+            'done': UserTaskStats.done + query.excluded.done,
+        },
+    ))
+    query = pg_insert(UserTaskDailyStats).values([
+        {'user_id': user_id, 'day': day, 'created': created, 'done': done}
+        for day, (created, done) in sorted(daily.items())
+    ])
+    await session.execute(query.on_conflict_do_update(
+        index_elements=[UserTaskDailyStats.user_id, UserTaskDailyStats.day],
+        set_={
+            'created': UserTaskDailyStats.created + query.excluded.created,
+            'done': UserTaskDailyStats.done + query.excluded.done,
+        },
+    ))
+
+
+async def rebuild_task_stats(
+    session: AsyncSession, user_ids: Sequence[int]
+) -> None:
+    '''
+    Пересчитывает счетчики задач пользователей по task_table
+    и архиву задач.
+    Строки пользователей блокируются, чтобы параллельные изменения задач
+    дождались конца пересчета.
+    '''
+    # в порядке id, как в archive_tasks, чтобы не было взаимоблокировок
+    await session.execute(
+        select(User.id)
+        .where(User.id.in_(user_ids))
+        .order_by(User.id)
+        .with_for_update()
+    )
+    await session.execute(delete(UserTaskDailyStats).where(
+        UserTaskDailyStats.user_id.in_(user_ids)))
+    await session.execute(delete(UserTaskStats).where(
+        UserTaskStats.user_id.in_(user_ids)))
+    tasks = union_all(*(
+        select(model.author_id, model.created_at, model.is_done)
+        .where(model.author_id.in_(user_ids))
+        for model in (Task, TaskArchive)
+    )).subquery('tasks')
+    day = cast(tasks.c.created_at, Date)
+    await session.execute(insert(UserTaskDailyStats).from_select(
+        ['user_id', 'day', 'created', 'done'],
+        select(
+            tasks.c.author_id,
+            day,
+            func.count(),
+            func.count().filter(tasks.c.is_done),
+        )
+        .group_by(tasks.c.author_id, day),
+    ))
+    await session.execute(insert(UserTaskStats).from_select(
+        ['user_id', 'total', 'done'],
+        select(
+            UserTaskDailyStats.user_id,
+            func.sum(UserTaskDailyStats.created),
+            func.sum(UserTaskDailyStats.done),
+        )
+        .where(UserTaskDailyStats.user_id.in_(user_ids))
+        .group_by(UserTaskDailyStats.user_id),
+    ))
+
+
+async def rebuild_all(
+    user_id: int | None = None, batch_size: int = REBUILD_BATCH_SIZE
+) -> None:
+    '''
+    Пересчитывает счетчики пользователя user_id
+    или всех пользователей порциями по batch_size.
+    '''
+    last_id = 0
+    while True:
+        async with async_session_factory() as session:
+            if user_id is not None:
+                user_ids = [] if last_id else [user_id]
+            else:
+                user_ids = (await session.execute(
+                    select(User.id)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )).scalars().all()
+            if not user_ids:
+                break
+            await rebuild_task_stats(session, user_ids)
+            await session.commit()
+        last_id = user_ids[-1]
+        print(f'rebuilt task stats up to user {last_id}')
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Task stats maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebuild = commands.add_parser('rebuild', help='recount task stats')
+    rebuild.add_argument('--user-id', type=int)
+    rebuild.add_argument(
+        '--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.command == 'rebuild':
+        asyncio.run(rebuild_all(args.user_id, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+'''
+Удаление старых отметок об удаленных задачах.
+
+Отметки нужны /tasks/changes/, чтобы клиенты узнали об удалениях.
+Отметки старше TASK_TOMBSTONE_RETENTION_DAYS удаляются, а у пользователя
+запоминается версия последней удаленной отметки: синхронизация с более
+ранней позиции получает 410 и должна начаться заново без since.
+Команду можно запускать по расписанию:
+
+    python -m src.tasks.tombstones prune [--older-than-days N] \\
+        [--batch-size N]
+'''
+import argparse
+import asyncio
+import datetime
+from typing import Sequence
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.config import settings
+from src.database.db import async_engine, async_session_factory
+from src.tasks.models import TaskTombstone
+
+
+PRUNE_BATCH_SIZE = 1000
+
+
+async def prune_tombstones(
+    session: AsyncSession, user_ids: Sequence[int], before: datetime.datetime
+) -> dict[int, int]:
+    '''
+    Удаляет отметки пользователей, созданные раньше before, и поднимает
+    tombstones_pruned_version одним запросом
+    WITH pruned AS (DELETE ... RETURNING) UPDATE.
+    Возвращает число удаленных отметок по пользователям.
+    '''
+    pruned = (
+        delete(TaskTombstone)
+        .where(
+            TaskTombstone.author_id.in_(user_ids),
+            TaskTombstone.deleted_at < before,
+        )
+        .returning(TaskTombstone.author_id, TaskTombstone.version)
+        .cte('pruned')
+    )
+    latest = (
+        select(
+            pruned.c.author_id,
+            func.max(pruned.c.version).label('version'),
+            func.count().label('count'),
+        )
+        .group_by(pruned.c.author_id)
+        .subquery('latest')
+    )
+    result = await session.execute(
+        update(User)
+        .where(User.id == latest.c.author_id)
+        .values(tombstones_pruned_version=func.greatest(
+            User.tombstones_pruned_version, latest.c.version))
+        .returning(User.id, latest.c.count)
+    )
+    return dict(result.all())
+
+
+async def prune_all(
+    older_than_days: int, batch_size: int = PRUNE_BATCH_SIZE
+) -> None:
+    '''Удаляет старые отметки всех пользователей порциями по batch_size.'''
+    before = datetime.datetime.utcnow() - datetime.timedelta(
+        days=older_than_days)
+    last_id = 0
+    total = 0
+    while True:
+        async with async_session_factory() as session:
+            user_ids = (await session.execute(
+                select(User.id)
+                .where(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not user_ids:
+                break
+            counts = await prune_tombstones(session, user_ids, before)
+            await session.commit()
+        last_id = user_ids[-1]
+        total += sum(counts.values())
+        print(f'pruned {total} tombstones up to user {last_id}')
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Task tombstone maintenance.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    prune = commands.add_parser(
+        'prune', help='delete tombstones older than the retention period')
+    prune.add_argument(
+        '--older-than-days', type=int,
+        default=settings.TASK_TOMBSTONE_RETENTION_DAYS)
+    prune.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.command == 'prune':
+        asyncio.run(prune_all(args.older_than_days, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import base64
+import csv
+import datetime
+import hashlib
+import io
+import json
+from typing import Any, Iterable, Sequence
+
+from fastapi import HTTPException, status
+
+
+CURSOR_NEXT = 'next'
+CURSOR_PREV = 'prev'
+
+
+def _pack(data: dict) -> str:
+    raw = json.dumps(data, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _unpack(cursor: str) -> dict:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(data, dict):
+        raise ValueError(cursor)
+    return data
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def encode_cursor(
+    created_at: datetime.datetime,
+    task_id: int,
+    direction: str = CURSOR_NEXT,
+) -> str:
+    '''Позволяет упаковать позицию (created_at, id) в непрозрачный курсор.'''
+    return _pack({'c': created_at.isoformat(), 'i': task_id, 'd': direction})
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int, str]:
+    '''Позволяет распаковать курсор обратно в (created_at, id, direction).'''
+    try:
+        data = _unpack(cursor)
+        direction = data.get('d', CURSOR_NEXT)
+        if direction not in (CURSOR_NEXT, CURSOR_PREV):
+            raise ValueError(direction)
+        return (
+            # created_at хранится без пояса, время с поясом переводим в UTC
+            to_naive_utc(datetime.datetime.fromisoformat(data['c'])),
+            int(data['i']),
+            direction,
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise _invalid_cursor()
+
+
+def encode_rank_cursor(rank: float, task_id: int) -> str:
+    '''Позволяет упаковать позицию (rank, id) результата поиска в курсор.'''
+    return _pack({'r': rank, 'i': task_id})
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    '''Позволяет распаковать курсор поиска обратно в (rank, id).'''
+    try:
+        data = _unpack(cursor)
+        return float(data['r']), int(data['i'])
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+
+
+def encode_sync_token(
+    version: int, task_id: int, start: int | None = None
+) -> str:
+    '''
+    Позволяет упаковать позицию (version, id) ленты изменений в токен.
+    start - версия задач в начале полной синхронизации, пока она идет.
+    '''
+    data = {'v': version, 'i': task_id}
+    if start is not None:
+        data['s'] = start
+    return _pack(data)
+
+
+def decode_sync_token(token: str) -> tuple[int, int, int | None]:
+    '''Позволяет распаковать токен ленты изменений в (version, id, start).'''
+    try:
+        data = _unpack(token)
+        start = data.get('s')
+        return (
+            int(data['v']),
+            int(data['i']),
+            None if start is None else int(start),
+        )
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_naive_utc(value: datetime.datetime | None) -> datetime.datetime | None:
+    '''
+    Позволяет привести время с часовым поясом к UTC без пояса,
+    как время хранится в БД. Время без пояса считается UTC.
+    '''
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def task_etag(task_id: int, updated_at: datetime.datetime) -> str:
+    '''Позволяет получить ETag задачи по ее id и времени изменения.'''
+    micros = (updated_at - EPOCH) // datetime.timedelta(microseconds=1)
+    return f'"{task_id}-{micros}"'
+
+
+def parse_task_etag(etag: str) -> tuple[int, datetime.datetime] | None:
+    '''Позволяет распаковать ETag задачи обратно в (id, updated_at).'''
+    try:
+        task_id, micros = etag.strip().strip('"').split('-')
+        return int(task_id), EPOCH + datetime.timedelta(
+            microseconds=int(micros))
+    except ValueError:
+        return None
+
+
+def list_etag(version: int, *params: Any) -> str:
+    '''
+    Позволяет получить ETag списка задач по версии задач пользователя
+    и параметрам запроса.
+    '''
+    digest = hashlib.blake2s(repr(params).encode(), digest_size=8).hexdigest()
+    return f'"v{version}-{digest}"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    '''Проверяет, совпадает ли ETag с одним из значений заголовка.'''
+    if header is None:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (
+        value.strip().removeprefix('W/') for value in header.split(',')
+    )
+
+
+def rows_to_ndjson(rows: Iterable[Any]) -> str:
+    '''Позволяет сериализовать строки задач в NDJSON.'''
+    return ''.join(
+        json.dumps(
+            row._asdict(), default=datetime.datetime.isoformat,
+            ensure_ascii=False,
+        ) + '\n'
+        for row in rows
+    )
+
+
+def rows_to_csv(rows: Iterable[Any], header: Sequence[str] = ()) -> str:
+    '''Позволяет сериализовать строки задач в CSV.'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows(
+        [
+            value.isoformat() if isinstance(value, datetime.datetime)
+            else value
+            for value in row
+        ]
+        for row in rows
+    )
+    return buffer.getvalue()
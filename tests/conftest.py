@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+
+# Settings требует параметры подключения, сами тесты к БД не подключаются
+for name, value in {
+    'DB_HOST': 'localhost',
+    'DB_PORT': '5432',
+    'POSTGRES_USER': 'test',
+    'POSTGRES_PASSWORD': 'test',
+    'POSTGRES_DB': 'test',
+    'JWT_SECRET_KEY': 'test',
+    'JWT_REFRESH_SECRET_KEY': 'test',
+}.items():
+    os.environ.setdefault(name, value)
+
+
+class FakeClock:
+    '''Заменяет модуль time в тестируемом модуле: время идет вручную.'''
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
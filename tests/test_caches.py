@@ -0,0 +1,201 @@
+import asyncio
+import random
+
+import pytest
+
+import src.auth.cache as auth_cache
+import src.tasks.cache as task_cache
+from src.auth.cache import ExpiringSet, TTLCache
+from src.tasks.cache import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch, clock):
+    monkeypatch.setattr(auth_cache, 'time', clock)
+    monkeypatch.setattr(task_cache, 'time', clock)
+
+
+def test_ttl_cache_expires(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    clock.advance(60)
+    assert cache.get('a') is None
+    assert cache.stats() == {
+        'size': 0, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_ttl_cache_entry_ttl_is_capped(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('short', 1, ttl=5)
+    cache.set('long', 2, ttl=600)
+    cache.set('expired', 3, ttl=0)
+    clock.advance(30)
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+    assert cache.get('expired') is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_cache_invalidate_and_disabled():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.get('a') is None
+    disabled = TTLCache(maxsize=0, ttl=60)
+    disabled.set('a', 1)
+    assert disabled.get('a') is None
+
+
+def test_expiring_set_expires(clock):
+    keys = ExpiringSet(maxsize=10)
+    keys.add('a', clock.now + 10)
+    keys.add('past', clock.now - 1)
+    assert 'a' in keys
+    assert 'past' not in keys
+    clock.advance(10)
+    assert 'a' not in keys
+
+
+def test_expiring_set_evicts_earliest_expiry(clock):
+    keys = ExpiringSet(maxsize=2)
+    keys.add('late', clock.now + 100)
+    keys.add('early', clock.now + 10)
+    keys.add('new', clock.now + 50)
+    assert 'early' not in keys
+    assert 'late' in keys and 'new' in keys
+    assert keys.stats()['evictions'] == 1
+
+
+def test_expiring_set_new_key_expiring_first_stays_tracked(clock):
+    keys = ExpiringSet(maxsize=2)
+    keys.add('a', clock.now + 100)
+    keys.add('b', clock.now + 200)
+    keys.add('first', clock.now + 10)
+    assert 'first' in keys
+    # ключ есть в куче и вытесняется, когда подходит его очередь
+    keys.add('c', clock.now + 300)
+    assert 'first' not in keys
+    assert keys.stats()['size'] == 2
+
+
+def test_expiring_set_extended_key_survives(clock):
+    keys = ExpiringSet(maxsize=2)
+    keys.add('a', clock.now + 10)
+    keys.add('a', clock.now + 100)
+    clock.advance(20)
+    keys.add('b', clock.now + 50)
+    assert 'a' in keys
+
+
+def test_expiring_set_heap_matches_data(clock):
+    keys = ExpiringSet(maxsize=5)
+    generator = random.Random(0)
+    for _ in range(2000):
+        keys.add(generator.randrange(30), clock.now + generator.uniform(1, 50))
+        clock.advance(generator.uniform(0, 1))
+        assert len(keys._data) <= 5
+        assert set(keys._data) <= {key for _, key in keys._expiry}
+
+
+def test_single_flight_shares_concurrent_calls():
+    flights = SingleFlight(maxsize=10, ttl=0)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return calls
+
+    async def run():
+        return await asyncio.gather(
+            *(flights.run(1, 'page', load) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert calls == 1
+    stats = flights.stats()
+    assert (stats['leaders'], stats['shared'], stats['in_flight']) == (1, 4, 0)
+
+
+def test_single_flight_caches_result_for_ttl(clock):
+    flights = SingleFlight(maxsize=10, ttl=5)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        first = await flights.run(1, 'page', load)
+        second = await flights.run(1, 'page', load)
+        clock.advance(5)
+        third = await flights.run(1, 'page', load)
+        flights.invalidate(1)
+        fourth = await flights.run(1, 'page', load)
+        return first, second, third, fourth
+
+    assert asyncio.run(run()) == (1, 1, 2, 3)
+    assert flights.stats()['cached'] == 1
+
+
+def test_single_flight_propagates_errors_without_caching():
+    flights = SingleFlight(maxsize=10, ttl=5)
+    attempts = 0
+
+    async def load():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0)
+        raise ValueError('boom')
+
+    async def run():
+        return await asyncio.gather(
+            *(flights.run(1, 'page', load) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert attempts == 1
+    with pytest.raises(ValueError):
+        asyncio.run(flights.run(1, 'page', load))
+    assert attempts == 2
+
+
+def test_single_flight_invalidate_detaches_running_call():
+    flights = SingleFlight(maxsize=10, ttl=0)
+    release = None
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        old = asyncio.create_task(flights.run(1, 'page', load))
+        await asyncio.sleep(0)
+        flights.invalidate(1)
+        new = asyncio.create_task(flights.run(1, 'page', load))
+        await asyncio.sleep(0)
+        release.set()
+        return await old, await new
+
+    assert asyncio.run(run()) == (2, 2)
+    assert calls == 2
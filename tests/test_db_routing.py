@@ -0,0 +1,88 @@
+import itertools
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.database.db as db
+import src.database.deps as deps
+from src.config import settings
+
+
+@pytest.fixture
+def replicas(monkeypatch, clock):
+    engines = [
+        create_async_engine(f'postgresql+asyncpg://u:p@replica{number}/db')
+        for number in range(2)
+    ]
+    monkeypatch.setattr(db, 'replica_engines', engines)
+    monkeypatch.setattr(
+        db, '_replica_cycle', itertools.cycle(range(len(engines))))
+    monkeypatch.setattr(db, '_recent_writes', {})
+    monkeypatch.setattr(db, 'time', clock)
+    monkeypatch.setattr(settings, 'DB_REPLICA_STRATEGY', 'round_robin')
+    monkeypatch.setattr(settings, 'DB_READ_YOUR_WRITES_SECONDS', 5)
+    return engines
+
+
+def test_without_replicas_reads_go_to_primary(monkeypatch):
+    monkeypatch.setattr(db, 'replica_engines', [])
+    assert db.choose_read_engine() is db.async_engine
+    assert db.choose_read_engine(1) is db.async_engine
+
+
+def test_round_robin(replicas):
+    chosen = [db.choose_read_engine() for _ in range(4)]
+    assert chosen == [replicas[0], replicas[1], replicas[0], replicas[1]]
+
+
+def test_read_your_writes_expires(replicas, clock):
+    db.mark_write(1)
+    assert db.wrote_recently(1)
+    assert db.choose_read_engine(1) is db.async_engine
+    # другие пользователи и чтения без пользователя идут в реплики
+    assert db.choose_read_engine(2) in replicas
+    assert db.choose_read_engine() in replicas
+
+    clock.advance(5)
+    assert not db.wrote_recently(1)
+    assert db.choose_read_engine(1) in replicas
+    assert 1 not in db._recent_writes
+
+
+def test_mark_write_is_noop_without_replicas(monkeypatch):
+    monkeypatch.setattr(db, 'replica_engines', [])
+    monkeypatch.setattr(db, '_recent_writes', {})
+    db.mark_write(1)
+    assert not db.wrote_recently(1)
+
+
+def test_mark_write_prunes_expired(replicas, clock, monkeypatch):
+    monkeypatch.setattr(db, 'RECENT_WRITES_MAX', 2)
+    for user_id in range(3):
+        db.mark_write(user_id)
+    clock.advance(10)
+    db.mark_write(100)
+    assert list(db._recent_writes) == [100]
+
+
+def test_least_connections(replicas, monkeypatch):
+    monkeypatch.setattr(settings, 'DB_REPLICA_STRATEGY', 'least_connections')
+    monkeypatch.setattr(replicas[0].pool, 'checkedout', lambda: 3)
+    monkeypatch.setattr(replicas[1].pool, 'checkedout', lambda: 1)
+    assert db.choose_read_engine() is replicas[1]
+
+
+def test_unit_of_work_reader_switches_to_primary_after_write(
+    replicas, monkeypatch
+):
+    monkeypatch.setattr(deps, 'choose_read_engine', db.choose_read_engine)
+    monkeypatch.setattr(deps, 'wrote_recently', db.wrote_recently)
+    uow = deps.UnitOfWork()
+    reader = uow.reader()
+    assert reader.bind in replicas
+    # без записи реплика остается одной на весь запрос
+    assert uow.reader(1) is reader
+
+    db.mark_write(1)
+    assert uow.reader(1) is uow.session
+    assert uow.reader() is uow.session
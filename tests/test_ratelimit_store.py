@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import src.ratelimit.store as store
+from src.ratelimit.store import MemoryStore
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch, clock):
+    monkeypatch.setattr(store, 'time', clock)
+
+
+def acquire(limiter: MemoryStore, key: str, rate: float, burst: int) -> float:
+    return asyncio.run(limiter.acquire(key, rate, burst))
+
+
+def test_burst_then_wait(clock):
+    limiter = MemoryStore(maxsize=10)
+    assert [acquire(limiter, 'a', 2, 3) for _ in range(3)] == [0, 0, 0]
+    assert acquire(limiter, 'a', 2, 3) == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert acquire(limiter, 'a', 2, 3) == 0
+
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = MemoryStore(maxsize=10)
+    acquire(limiter, 'a', 1, 2)
+    clock.advance(100)
+    assert [acquire(limiter, 'a', 1, 2) for _ in range(3)] == [
+        0, 0, pytest.approx(1)]
+
+
+def test_keys_are_independent():
+    limiter = MemoryStore(maxsize=10)
+    assert acquire(limiter, 'a', 1, 1) == 0
+    assert acquire(limiter, 'a', 1, 1) > 0
+    assert acquire(limiter, 'b', 1, 1) == 0
+
+
+def test_prune_drops_full_buckets_first(clock):
+    limiter = MemoryStore(maxsize=2)
+    acquire(limiter, 'idle', 1, 1)
+    clock.advance(10)
+    acquire(limiter, 'busy', 1, 5)
+    acquire(limiter, 'new', 1, 5)
+    assert set(limiter._buckets) == {'busy', 'new'}
+
+
+def test_prune_evicts_oldest_when_all_active():
+    limiter = MemoryStore(maxsize=2)
+    for key in ('a', 'b', 'c'):
+        acquire(limiter, key, 1, 5)
+    assert list(limiter._buckets) == ['b', 'c']
+    assert limiter.stats() == {'buckets': 2}
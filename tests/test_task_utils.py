@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from src.tasks.utils import (
+    CURSOR_PREV,
+    _pack,
+    decode_cursor,
+    decode_rank_cursor,
+    decode_sync_token,
+    encode_cursor,
+    encode_rank_cursor,
+    encode_sync_token,
+    etag_matches,
+    list_etag,
+    parse_task_etag,
+    task_etag,
+    to_naive_utc,
+)
+
+
+CREATED_AT = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(CREATED_AT, 7)) == (
+        CREATED_AT, 7, 'next')
+    assert decode_cursor(encode_cursor(CREATED_AT, 7, CURSOR_PREV)) == (
+        CREATED_AT, 7, CURSOR_PREV)
+
+
+def test_cursor_with_timezone_is_converted_to_naive_utc():
+    cursor = _pack({'c': '2024-01-01T00:00:00+03:00', 'i': 1})
+    assert decode_cursor(cursor) == (
+        datetime.datetime(2023, 12, 31, 21, 0), 1, 'next')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    _pack({'c': 'yesterday', 'i': 1}),
+    _pack({'c': CREATED_AT.isoformat()}),
+    _pack({'c': CREATED_AT.isoformat(), 'i': 1, 'd': 'sideways'}),
+    'WzFd',  # JSON-список вместо объекта
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_rank_cursor_round_trip():
+    assert decode_rank_cursor(encode_rank_cursor(0.25, 3)) == (0.25, 3)
+    with pytest.raises(HTTPException):
+        decode_rank_cursor(_pack({'r': 'high', 'i': 3}))
+
+
+def test_sync_token_round_trip():
+    assert decode_sync_token(encode_sync_token(5, 9)) == (5, 9, None)
+    assert decode_sync_token(encode_sync_token(5, 9, start=4)) == (5, 9, 4)
+    with pytest.raises(HTTPException):
+        decode_sync_token(_pack({'v': 5}))
+
+
+def test_to_naive_utc():
+    assert to_naive_utc(None) is None
+    assert to_naive_utc(CREATED_AT) is CREATED_AT
+    aware = CREATED_AT.replace(
+        tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    assert to_naive_utc(aware) == CREATED_AT - datetime.timedelta(hours=2)
+
+
+def test_task_etag_round_trip():
+    etag = task_etag(42, CREATED_AT)
+    assert parse_task_etag(etag) == (42, CREATED_AT)
+    assert parse_task_etag('"garbage"') is None
+
+
+def test_list_etag_depends_on_version_and_params():
+    etag = list_etag(3, None, 100, 0)
+    assert etag == list_etag(3, None, 100, 0)
+    assert etag != list_etag(4, None, 100, 0)
+    assert etag != list_etag(3, True, 100, 0)
+    assert etag.startswith('"v3-')
+
+
+def test_etag_matches():
+    etag = '"v1-abc"'
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)